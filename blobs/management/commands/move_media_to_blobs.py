@@ -0,0 +1,30 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from medicines.models import Medicine
+from utils.storage import blob_storage, is_blob
+
+
+class Command(BaseCommand):
+    help = 'Store medicine images uploaded before content addressing as blobs, duplicates are kept once'
+
+    def handle(self, *args, **options):
+        legacy_names = set()
+        blob_names = set()
+        for medicine in Medicine.objects.exclude(image='').iterator():
+            name = medicine.image.name
+            if is_blob(name) or not default_storage.exists(name):
+                continue
+
+            with default_storage.open(name) as content, transaction.atomic():
+                medicine.image = blob_storage.save(name, content)
+                medicine.save()
+            legacy_names.add(name)
+            blob_names.add(medicine.image.name)
+
+        for name in legacy_names:
+            if not Medicine.objects.filter(image=name).exists():
+                default_storage.delete(name)
+
+        self.stdout.write(f'Moved {len(legacy_names)} images into {len(blob_names)} blobs')
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blobs.models import Blob
+from utils.storage import blob_storage
+
+
+def delete_file(blob):
+    # An upload of the same content may have created the row again since the commit
+    if not Blob.objects.filter(digest=blob.digest).exists():
+        blob_storage.delete(blob.name)
+
+
+class Command(BaseCommand):
+    help = 'Delete stored blobs which nothing has referenced for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Keep unreferenced blobs this long, an upload may be about to use them')
+
+    def handle(self, *args, **options):
+        deadline = timezone.now() - datetime.timedelta(hours=options['grace_hours'])
+
+        deleted = 0
+        for digest in Blob.objects.filter(refcount__lte=0, updated_at__lt=deadline).values_list('digest', flat=True):
+            with transaction.atomic():
+                # Checked again under the row lock, the blob may have been acquired or uploaded again since
+                blob = Blob.objects.select_for_update().filter(
+                    digest=digest, refcount__lte=0, updated_at__lt=deadline
+                ).first()
+                if blob is None:
+                    continue
+                blob.delete()
+                # Only once the row is gone, a failed commit must not leave a row without its file
+                transaction.on_commit(lambda blob=blob: delete_file(blob))
+                deleted += 1
+
+        self.stdout.write(f'Deleted {deleted} blobs')
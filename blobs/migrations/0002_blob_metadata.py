@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='metadata',
+            field=models.JSONField(blank=True, help_text='Metadata extracted by utils.media.extract_metadata_many', null=True),
+        ),
+    ]
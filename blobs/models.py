@@ -0,0 +1,39 @@
+from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+
+class BlobManager(models.Manager):
+    def acquire(self, names):
+        self.filter(name__in=names).update(refcount=F('refcount') + 1, updated_at=timezone.now())
+
+    def release(self, names):
+        # A blob at zero is deleted later by prune_blobs, an upload of the same content may be reusing it right now
+        self.filter(name__in=names).update(refcount=F('refcount') - 1, updated_at=timezone.now())
+
+
+class Blob(models.Model):
+    """File stored once under the sha256 of its content, see utils.storage"""
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(
+        default=0,
+        help_text='Number of model fields referencing the blob'
+    )
+    metadata = models.JSONField(
+        null=True,
+        blank=True,
+        help_text='Metadata extracted by utils.media.extract_metadata_many'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+    class Meta:
+        verbose_name = 'Blob'
+        verbose_name_plural = 'Blobs'
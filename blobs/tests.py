@@ -0,0 +1,66 @@
+import datetime
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from blobs.models import Blob
+from medicines.models import Medicine
+
+
+class BlobStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create(self, content, name='photo.JPG'):
+        return Medicine.objects.create(
+            name='Aspirin', description='', price=100,
+            image=SimpleUploadedFile(name, content, content_type='image/jpeg')
+        )
+
+    def blob_files(self):
+        return sorted(
+            name for _, _, names in os.walk(os.path.join(self.media_root, 'media', 'blobs')) for name in names
+        )
+
+    def test_same_content_is_stored_once(self):
+        medicines = [self.create(b'photo', name=f'upload-{i}.JPG') for i in range(3)]
+        other = self.create(b'other photo')
+
+        blob = Blob.objects.get(name=medicines[0].image.name)
+        self.assertEqual({medicine.image.name for medicine in medicines}, {blob.name})
+        self.assertTrue(blob.name.endswith(f'{blob.digest}.jpg'))
+        self.assertEqual((blob.size, blob.refcount), (5, 3))
+        self.assertEqual(len(self.blob_files()), 2)
+
+        medicines[0].image = other.image.name
+        medicines[0].save()
+        medicines[1].delete()
+
+        self.assertEqual(Blob.objects.get(name=blob.name).refcount, 1)
+        self.assertEqual(Blob.objects.get(name=other.image.name).refcount, 2)
+
+    def test_prune_deletes_unreferenced_blobs_after_grace(self):
+        kept = self.create(b'kept')
+        dropped = self.create(b'dropped')
+        name = dropped.image.name
+        dropped.delete()
+
+        call_command('prune_blobs', stdout=io.StringIO())
+        self.assertTrue(Blob.objects.filter(name=name).exists())
+
+        Blob.objects.filter(name=name).update(updated_at=timezone.now() - datetime.timedelta(days=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('prune_blobs', stdout=io.StringIO())
+
+        self.assertEqual(list(Blob.objects.values_list('name', flat=True)), [kept.image.name])
+        self.assertEqual(self.blob_files(), [os.path.basename(kept.image.name)])
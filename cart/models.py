@@ -1,7 +1,99 @@
-from django.db import models
+from django.db import connections, models, transaction
 
 from medicines.models import Medicine
 from users.models import User
+from utils.base_model import write_db
+
+
+class CartManager(models.Manager):
+    """
+    Quantity changes are single statements on the (user, medicine) unique key,
+    so concurrent taps can't lose updates. Both return (quantity, updated_at, medicine card).
+    """
+
+    def _with_card(self, row):
+        if row is None:
+            return None
+
+        quantity, updated_at, card = row
+        card = Medicine._meta.get_field('card').from_db_value(card, None, connections[self.db])
+        return quantity, updated_at, card
+
+    def increment(self, user_id, medicine_id):
+        """Add one medicine to the cart, returns None if there is no such medicine"""
+        table = self.model._meta.db_table
+        medicine_table = Medicine._meta.db_table
+
+        with connections[write_db(self)].cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {table} (user_id, medicine_id, quantity, updated_at)
+                SELECT %s, id, 1, now() FROM {medicine_table} WHERE id = %s
+                ON CONFLICT (user_id, medicine_id)
+                DO UPDATE SET quantity = {table}.quantity + 1, updated_at = EXCLUDED.updated_at
+                RETURNING quantity, updated_at, (SELECT card FROM {medicine_table} WHERE id = medicine_id)
+            ''', [user_id, medicine_id])
+            return self._with_card(cursor.fetchone())
+
+    def decrement(self, user_id, medicine_id):
+        """Remove one medicine from the cart, the item is deleted when it drops to zero"""
+        table = self.model._meta.db_table
+        medicine_table = Medicine._meta.db_table
+
+        db = write_db(self)
+        with transaction.atomic(using=db), connections[db].cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE {table} SET quantity = quantity - 1, updated_at = now()
+                WHERE user_id = %s AND medicine_id = %s AND quantity > 0
+                RETURNING quantity, updated_at, (SELECT card FROM {medicine_table} WHERE id = medicine_id)
+            ''', [user_id, medicine_id])
+            row = cursor.fetchone()
+
+            if row is not None and row[0] <= 0:
+                # The row is locked by the update above until commit
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE user_id = %s AND medicine_id = %s AND quantity <= 0',
+                    [user_id, medicine_id]
+                )
+
+        return self._with_card(row)
+
+    def apply_changes(self, user_id, quantities, deltas):
+        """
+        Set `quantities` and add `deltas` ({medicine_id: value}) in one upsert,
+        then delete items which dropped to zero. Returns ids of medicines which were found.
+        """
+        table = self.model._meta.db_table
+        medicine_table = Medicine._meta.db_table
+
+        changes = [(medicine_id, quantity, False) for medicine_id, quantity in quantities.items()]
+        changes += [(medicine_id, delta, True) for medicine_id, delta in deltas.items()]
+        if not changes:
+            return set()
+
+        values = ', '.join(['(%s, %s, %s)'] * len(changes))
+        params = [value for change in changes for value in change]
+
+        db = write_db(self)
+        with transaction.atomic(using=db), connections[db].cursor() as cursor:
+            cursor.execute(f'''
+                WITH changes (medicine_id, quantity, is_delta) AS (VALUES {values})
+                INSERT INTO {table} (user_id, medicine_id, quantity, updated_at)
+                SELECT %s, m.id, c.quantity, now()
+                FROM changes c JOIN {medicine_table} m ON m.id = c.medicine_id
+                ON CONFLICT (user_id, medicine_id) DO UPDATE SET
+                    quantity = CASE
+                        WHEN (SELECT is_delta FROM changes WHERE medicine_id = EXCLUDED.medicine_id)
+                        THEN {table}.quantity + EXCLUDED.quantity
+                        ELSE EXCLUDED.quantity
+                    END,
+                    updated_at = EXCLUDED.updated_at
+                RETURNING medicine_id
+            ''', params + [user_id])
+            found = {row[0] for row in cursor.fetchall()}
+
+            cursor.execute(f'DELETE FROM {table} WHERE user_id = %s AND quantity <= 0', [user_id])
+
+        return found
 
 
 class Cart(models.Model):
@@ -21,6 +113,8 @@ class Cart(models.Model):
         auto_now=True
     )
 
+    objects = CartManager()
+
     def add(self, medicine):
         self.medicine = medicine
         self.quantity += 1
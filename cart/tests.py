@@ -1,3 +1,138 @@
-from django.test import TestCase
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from cart.models import Cart
+from medicines.models import Medicine
+from users.authentication import token_cache
+from users.models import User
+
+
+class CartTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.medicine = Medicine.objects.create(name='Aspirin', description='', price=100)
+
+    def test_add_and_remove(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('add_to_cart'), {'medicine_id': self.medicine.id}, format='json')
+        self.assertEqual(response.data['quantity'], 1)
+        self.assertEqual(response.data['medicine']['name'], 'Aspirin')
+
+        response = self.client.post(reverse('add_to_cart'), {'medicine_id': self.medicine.id}, format='json')
+        self.assertEqual(response.data['quantity'], 2)
+
+        response = self.client.post(reverse('remove_from_cart'), {'medicine_id': self.medicine.id}, format='json')
+        self.assertEqual(response.data['quantity'], 1)
+
+        response = self.client.post(reverse('remove_from_cart'), {'medicine_id': self.medicine.id}, format='json')
+        self.assertIsNone(response.data)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_add_unknown_medicine(self):
+        response = self.client.post(reverse('add_to_cart'), {'medicine_id': 0}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_batch_update(self):
+        other = Medicine.objects.create(name='Nurofen', description='', price=200)
+        third = Medicine.objects.create(name='Citramon', description='', price=50)
+        Cart.objects.create(user=self.user, medicine=self.medicine, quantity=3)
+        Cart.objects.create(user=self.user, medicine=third, quantity=1)
+
+        Cart.objects.apply_changes(self.user.id, {third.id: 0}, {self.medicine.id: 2, other.id: 1})
+
+        response = self.client.post(reverse('batch_update_cart'), {'items': [
+            {'medicine_id': self.medicine.id, 'delta': -1},
+            {'medicine_id': other.id, 'quantity': 5},
+            {'medicine_id': other.id, 'delta': -2},
+            {'medicine_id': 0, 'delta': 1},
+        ]}, format='json')
+
+        quantities = {item['medicine']['name']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(quantities, {'Aspirin': 4, 'Nurofen': 3})
+        self.assertEqual(response.data['total'], '1000.00')
+        self.assertEqual(response.data['not_found_medicines'], [0])
+
+    def test_get_cart_is_one_query(self):
+        for i in range(5):
+            medicine = Medicine.objects.create(name=f'Medicine {i}', description='', price=10 + i)
+            Cart.objects.create(user=self.user, medicine=medicine, quantity=2)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('get_cart'))
+
+        self.assertEqual([item['total'] for item in response.data['items']], ['20.00', '22.00', '24.00', '26.00', '28.00'])
+        self.assertEqual(response.data['total'], '120.00')
+
+    def test_token_requests_are_served_by_the_async_view(self):
+        Cart.objects.create(user=self.user, medicine=self.medicine, quantity=2)
+        expected = self.client.get(reverse('get_cart')).json()
+        token_cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        client.get(reverse('get_cart'))
+
+        with mock.patch('cart.views.serialize_cart', side_effect=AssertionError('sync view called')):
+            with self.assertNumQueries(1):
+                response = client.get(reverse('get_cart'))
+
+        self.assertEqual(response.json(), expected)
+
+    def test_batch_update_validation(self):
+        response = self.client.post(reverse('batch_update_cart'), {'items': [{'medicine_id': 1}]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CartConcurrencyTest(TransactionTestCase):
+    threads = 8
+    taps = 25
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.medicine = Medicine.objects.create(name='Aspirin', description='', price=100)
+
+    def tap_in_parallel(self, tap):
+        barrier = threading.Barrier(self.threads)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.taps):
+                    tap(self.user.id, self.medicine.id)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    def test_parallel_increments_are_not_lost(self):
+        self.tap_in_parallel(Cart.objects.increment)
+
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, self.threads * self.taps)
+
+        self.tap_in_parallel(Cart.objects.decrement)
+
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    @skipUnless(settings.DB_POOL_SIZE, 'Connections are not pooled')
+    def test_threads_reuse_pooled_connections(self):
+        self.tap_in_parallel(Cart.objects.increment)
+        connects = connection.pool.stats()['connects']
+
+        self.tap_in_parallel(Cart.objects.increment)
+
+        self.assertEqual(connection.pool.stats()['connects'], connects)
@@ -1,9 +1,10 @@
 from django.urls import path
 
-from cart.views import add_to_cart, get_cart, remove_from_cart
+from cart.views import add_to_cart, batch_update_cart, get_cart_async, remove_from_cart
 
 urlpatterns = [
     path('', add_to_cart, name='add_to_cart'),
     path('/delete', remove_from_cart, name='remove_from_cart'),
-    path('/list', get_cart, name='get_cart'),
+    path('/list', get_cart_async, name='get_cart'),
+    path('/batch', batch_update_cart, name='batch_update_cart'),
 ]
@@ -1,11 +1,15 @@
-from django.shortcuts import get_object_or_404
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Window
+from django.http import Http404
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from medicines.models import Medicine
-from medicines.serializers import MedicineSerializer
+from cart.models import Cart
+from medicines.cards import abuild_cards, build_cards
+from utils.asyncviews import async_api_view
 
 
 @api_view(['POST'])
@@ -13,24 +17,17 @@ from medicines.serializers import MedicineSerializer
 def add_to_cart(request):
     medicine_id = request.data['medicine_id']
 
-    medicine = get_object_or_404(Medicine, id=medicine_id)
-    cart_item = request.user.carts.filter(medicine=medicine).first()
-
-    if cart_item:
-        cart_item.quantity += 1
-        cart_item.save()
-    else:
-        cart_item = request.user.carts.create(
-            medicine=medicine,
-            quantity=1
-        )
+    cart_item = Cart.objects.increment(request.user.id, medicine_id)
+    if cart_item is None:
+        raise Http404
 
-    medicine_serialized = MedicineSerializer(medicine, context={'request': request}).data
+    quantity, updated_at, card = cart_item
+    medicine_serialized = build_cards([{'id': medicine_id, 'card': card}], request)[0]
 
     return Response({
         'medicine': medicine_serialized,
-        'quantity': cart_item.quantity,
-        'updated_at': cart_item.updated_at
+        'quantity': quantity,
+        'updated_at': updated_at
     }, status=status.HTTP_200_OK)
 
 
@@ -39,42 +36,122 @@ def add_to_cart(request):
 def remove_from_cart(request):
     medicine_id = request.data['medicine_id']
 
-    medicine = get_object_or_404(Medicine, id=medicine_id)
-    cart_item = request.user.carts.filter(medicine=medicine).first()
-
-    if cart_item:
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.save()
-        else:
-            cart_item.delete()
+    cart_item = Cart.objects.decrement(request.user.id, medicine_id)
 
-    medicine_serialized = MedicineSerializer(medicine, context={'request': request}).data
-
-    if cart_item.quantity == 0:
+    if cart_item is None or cart_item[0] <= 0:
         return Response(None, status=status.HTTP_200_OK)
 
+    quantity, updated_at, card = cart_item
     cart_serialized = {
-        'medicine': medicine_serialized,
-        'quantity': cart_item.quantity,
-        'updated_at': cart_item.updated_at
+        'medicine': build_cards([{'id': medicine_id, 'card': card}], request)[0],
+        'quantity': quantity,
+        'updated_at': updated_at
     }
 
     return Response(cart_serialized, status=status.HTTP_200_OK)
 
 
+MAX_BATCH_SIZE = 500
+CART_TOTAL_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def cart_rows(user):
+    """
+    Cart items with line totals and the cart total, all computed by the database in one query.
+    Medicines come from their stored cards, so nothing else is loaded per item.
+    """
+    line_total = ExpressionWrapper(F('quantity') * F('medicine__price'), output_field=CART_TOTAL_FIELD)
+    return (
+        user.carts
+        .annotate(line_total=line_total, cart_total=Window(Sum(line_total)))
+        .order_by('id')
+        .values('medicine_id', 'medicine__card', 'quantity', 'updated_at', 'line_total', 'cart_total')
+    )
+
+
+def build_cart(rows, cards):
+    cards = {card['id']: card for card in cards}
+
+    items = []
+    for row in rows:
+        items.append({
+            'medicine': cards.get(row['medicine_id']),
+            'quantity': row['quantity'],
+            'total': str(row['line_total']),
+            'updated_at': row['updated_at']
+        })
+
+    total = rows[0]['cart_total'] if rows else Decimal('0.00')
+
+    return {'items': items, 'total': str(total)}
+
+
+def serialize_cart(request):
+    rows = list(cart_rows(request.user))
+    cards = build_cards(rows, request, id_field='medicine_id', card_field='medicine__card')
+
+    return build_cart(rows, cards)
+
+
+async def aserialize_cart(request):
+    rows = [row async for row in cart_rows(request.user)]
+    cards = await abuild_cards(rows, request, id_field='medicine_id', card_field='medicine__card')
+
+    return build_cart(rows, cards)
+
+
+def parse_cart_changes(items):
+    """
+    Fold [{medicine_id, delta} | {medicine_id, quantity}] in order into
+    absolute quantities and relative deltas per medicine
+    """
+    if not isinstance(items, list) or len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'items must be a list of at most {MAX_BATCH_SIZE} changes')
+
+    quantities = {}
+    deltas = {}
+    for item in items:
+        try:
+            medicine_id = int(item['medicine_id'])
+            if 'quantity' in item:
+                quantity = int(item['quantity'])
+                if quantity < 0:
+                    raise ValueError('quantity must not be negative')
+                quantities[medicine_id] = quantity
+                deltas.pop(medicine_id, None)
+            elif medicine_id in quantities:
+                quantities[medicine_id] = max(quantities[medicine_id] + int(item['delta']), 0)
+            else:
+                deltas[medicine_id] = deltas.get(medicine_id, 0) + int(item['delta'])
+        except (KeyError, TypeError) as e:
+            raise ValueError('every item needs medicine_id and either delta or quantity') from e
+
+    return quantities, deltas
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch_update_cart(request):
+    try:
+        quantities, deltas = parse_cart_changes(request.data.get('items'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    found = Cart.objects.apply_changes(request.user.id, quantities, deltas)
+    not_found_medicines = [medicine_id for medicine_id in {**quantities, **deltas} if medicine_id not in found]
+
+    return Response({
+        **serialize_cart(request),
+        'not_found_medicines': not_found_medicines,
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_cart(request):
-    cart_items = request.user.carts.all()
-
-    medicines = []
-    for cart_item in cart_items:
-        medicine = MedicineSerializer(cart_item.medicine, context={'request': request}).data
-        medicines.append({
-            'medicine': medicine,
-            'quantity': cart_item.quantity,
-            'updated_at': cart_item.updated_at
-        })
+    return Response(serialize_cart(request), status=status.HTTP_200_OK)
+
 
-    return Response(medicines, status=status.HTTP_200_OK)
+@async_api_view(get_cart, ['GET'])
+async def get_cart_async(request):
+    return Response(await aserialize_cart(request), status=status.HTTP_200_OK)
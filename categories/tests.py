@@ -1,3 +1,68 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from categories.models import Category
+from users.authentication import token_cache
+from users.models import User
+
+
+class GetCategoriesCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Category.objects.create(name='Painkillers')
+
+    def test_conditional_request_is_served_from_memory(self):
+        response = self.client.get(reverse('get_categories'))
+        etag = response['ETag']
+        self.assertEqual(response.json(), [{'id': Category.objects.get().id, 'name': 'Painkillers'}])
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(reverse('get_categories'), HTTP_IF_NONE_MATCH=etag)
+            cached = self.client.get(reverse('get_categories'))
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(cached.content, response.content)
+
+    def test_write_invalidates_cache(self):
+        etag = self.client.get(reverse('get_categories'))['ETag']
+
+        Category.objects.create(name='Antibiotics')
+
+        response = self.client.get(reverse('get_categories'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([category['name'] for category in response.json()], ['Antibiotics', 'Painkillers'])
+
+    def test_commit_invalidates_bodies_built_during_the_write(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Category.objects.create(name='Antibiotics')
+            # Cached while the write is not committed yet
+            self.client.get(reverse('get_categories'))
+
+        for callback in callbacks:
+            callback()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('get_categories'))
+        self.assertTrue(queries.captured_queries)
+
+    def test_async_view_serves_tokens_and_leaves_the_rest_to_drf(self):
+        token_cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        response = client.get(reverse('get_categories'))
+
+        with self.assertNumQueries(0):
+            cached = client.get(reverse('get_categories'))
+
+        client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        unauthorized = client.get(reverse('get_categories'))
+
+        self.assertEqual(response.json(), [{'id': Category.objects.get().id, 'name': 'Painkillers'}])
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(unauthorized.status_code, 401)
+        self.assertIn('detail', unauthorized.json())
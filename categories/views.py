@@ -6,6 +6,8 @@ from rest_framework.response import Response
 
 from categories.models import Category
 from medicines.serializers import CategorySerializer
+from utils.asyncviews import async_api_view
+from utils.cache import cached_json
 
 
 # Create your views here.
@@ -26,6 +28,7 @@ def create_category(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_json(Category)
 def get_categories(request):
     categories = Category.objects.all().order_by('name')
     serializer = CategorySerializer(categories, many=True).data
@@ -33,6 +36,15 @@ def get_categories(request):
     return Response(serializer, status=status.HTTP_200_OK)
 
 
+@async_api_view(get_categories, ['GET'])
+@cached_json(Category)
+async def get_categories_async(request):
+    categories = [category async for category in Category.objects.all().order_by('name')]
+    serializer = CategorySerializer(categories, many=True).data
+
+    return Response(serializer, status=status.HTTP_200_OK)
+
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])  # TODO: Add IsStaff permission
 def update_category(request, category_id):
@@ -33,6 +33,18 @@ server {
         client_max_body_size 100M;
     }
 
+    # Blobs are named by the sha256 of their content, a URL always serves the same bytes
+    location /media/media/blobs/ {
+        alias /vol/media/media/blobs/;
+        add_header Strict-Transport-Security "max-age=31536000; includeSubDomains" always;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        access_log off;
+    }
+
+    location /media/ {
+        alias /vol/media/;
+    }
+
     location /ws/ {
         proxy_http_version 1.1;
         proxy_set_header Upgrade $http_upgrade;
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from inventory.models import Stock
+
+
+class StockAdmin(admin.ModelAdmin):
+    model = Stock
+    list_display = ('medicine', 'available', 'reserved', 'updated_at')
+    search_fields = ('medicine__name',)
+    raw_id_fields = ('medicine',)
+    # Reserved units belong to pending orders and change only with them
+    readonly_fields = ('reserved', 'updated_at')
+
+    def get_readonly_fields(self, request, obj=None):
+        return self.readonly_fields + ('medicine',) if obj else self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=['available', 'updated_at'])
+        else:
+            obj.save()
+
+
+admin.site.register(Stock, StockAdmin)
@@ -0,0 +1,111 @@
+import statistics
+import threading
+import time
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.core.management.base import BaseCommand
+
+from inventory.models import OutOfStock, Stock
+from medicines.models import Medicine
+
+
+def reserve_with_lock(quantities):
+    """The SELECT FOR UPDATE variant, kept here only as the baseline"""
+    with transaction.atomic():
+        # Locked in id order, like the conditional update, so it can't deadlock either
+        rows = Stock.objects.select_for_update().filter(pk__in=list(quantities)).order_by('pk')
+        stock = {row.pk: row for row in rows}
+        short = [
+            medicine_id for medicine_id, quantity in quantities.items()
+            if medicine_id in stock and stock[medicine_id].available < quantity
+        ]
+        if short:
+            raise OutOfStock(short)
+        for medicine_id, quantity in quantities.items():
+            Stock.objects.filter(pk=medicine_id).update(
+                available=F('available') - quantity,
+                reserved=F('reserved') + quantity
+            )
+
+
+def reserve_with_update(quantities):
+    with transaction.atomic():
+        Stock.objects.reserve(quantities)
+
+
+STRATEGIES = {
+    'update': reserve_with_update,
+    'lock': reserve_with_lock,
+}
+
+
+class Command(BaseCommand):
+    help = 'Measure checkout reservations of one hot medicine by many concurrent clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--checkouts', type=int, default=200, help='Checkouts per thread')
+        parser.add_argument('--basket', type=int, default=5, help='Medicines per basket, the first one is hot')
+        parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+
+    def handle(self, *args, **options):
+        # Threads use their own connections, so the data has to be committed and is deleted at the end
+        medicines = Medicine.objects.bulk_create([
+            Medicine(name=f'Benchmark medicine {i}', description='', price=100)
+            for i in range(options['basket'])
+        ])
+        try:
+            for strategy in options['strategies']:
+                self.run(STRATEGIES[strategy], strategy, medicines, options)
+        finally:
+            Medicine.objects.filter(pk__in=[medicine.pk for medicine in medicines]).delete()
+
+    def run(self, reserve, name, medicines, options):
+        threads = options['threads']
+        checkouts = options['checkouts']
+        total = threads * checkouts
+        # The hot medicine runs out halfway, so failed reservations are measured too
+        Stock.objects.filter(medicine__in=medicines).delete()
+        Stock.objects.restock({medicines[0].pk: total // 2})
+        Stock.objects.restock({medicine.pk: total for medicine in medicines[1:]})
+
+        barrier = threading.Barrier(threads + 1)
+        timings = []
+        succeeded = []
+
+        def worker():
+            local_timings = []
+            local_succeeded = 0
+            try:
+                barrier.wait()
+                for _ in range(checkouts):
+                    start = time.perf_counter()
+                    try:
+                        reserve({medicine.pk: 1 for medicine in medicines})
+                        local_succeeded += 1
+                    except OutOfStock:
+                        pass
+                    local_timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+                timings.extend(local_timings)
+                succeeded.append(local_succeeded)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        hot = Stock.objects.get(medicine=medicines[0])
+        oversold = hot.reserved != total // 2 or sum(succeeded) != total // 2 or hot.available != 0
+        quantiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f'{name:>6}: {total / elapsed:.0f} checkouts/s p50={quantiles[49]:.2f}ms p95={quantiles[94]:.2f}ms '
+            f'p99={quantiles[98]:.2f}ms reserved={sum(succeeded)}/{total} '
+            f'{"OVERSOLD" if oversold else "consistent"}'
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('medicines', '0004_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stock',
+            fields=[
+                ('medicine', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock', serialize=False, to='medicines.medicine')),
+                ('available', models.PositiveIntegerField(default=0, help_text='Units which can be ordered')),
+                ('reserved', models.PositiveIntegerField(default=0, help_text='Units of pending orders')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Stock',
+                'verbose_name_plural': 'Stock',
+            },
+        ),
+    ]
@@ -0,0 +1,107 @@
+from django.db import connections, models
+
+from medicines.models import Medicine
+from utils.base_model import write_db
+
+
+class OutOfStock(Exception):
+    def __init__(self, medicine_ids):
+        super().__init__(f'Not enough stock of medicines {medicine_ids}')
+        self.medicine_ids = medicine_ids
+
+
+class StockManager(models.Manager):
+    """
+    Stock is changed only with single-statement conditional updates. Checkouts and order transitions
+    (OrderQuerySet.transition) lock the stock rows in medicine order within the statement, so they
+    can't deadlock each other. A hot row stays locked only from its update to the commit of the transaction.
+    """
+
+    def reserve(self, quantities):
+        """
+        Move {medicine_id: quantity} from available to reserved in one statement, returns ids of the medicines reserved.
+        Raises OutOfStock with the medicines that are short, the caller's transaction must be rolled back then.
+        Medicines without a stock row aren't tracked and are never short, their stock is tracked from the first restock.
+        """
+        if not quantities:
+            return set()
+
+        table = self.model._meta.db_table
+        lines = sorted(quantities.items())
+        values = ', '.join(['(%s, %s)'] * len(lines))
+        params = [value for line in lines for value in line]
+
+        with connections[write_db(self)].cursor() as cursor:
+            # The join order of UPDATE ... FROM is up to the planner, so it only updates rows
+            # the ordered subquery has already locked
+            cursor.execute(f'''
+                WITH r (medicine_id, quantity) AS (VALUES {values}),
+                locked AS MATERIALIZED (
+                    SELECT s.medicine_id FROM {table} s JOIN r ON r.medicine_id = s.medicine_id
+                    ORDER BY s.medicine_id
+                    FOR UPDATE OF s
+                ), updated AS (
+                    UPDATE {table} s
+                    SET available = s.available - r.quantity, reserved = s.reserved + r.quantity
+                    FROM r JOIN locked k ON k.medicine_id = r.medicine_id
+                    WHERE s.medicine_id = r.medicine_id AND s.available >= r.quantity
+                    RETURNING s.medicine_id
+                )
+                SELECT k.medicine_id, u.medicine_id IS NOT NULL
+                FROM locked k LEFT JOIN updated u ON u.medicine_id = k.medicine_id
+            ''', params)
+            tracked = dict(cursor.fetchall())
+
+        short = [medicine_id for medicine_id, _ in lines if tracked.get(medicine_id) is False]
+        if short:
+            raise OutOfStock(short)
+        return set(tracked)
+
+    def restock(self, quantities):
+        """Add {medicine_id: quantity} to available stock, returns ids of medicines which were found"""
+        if not quantities:
+            return set()
+
+        table = self.model._meta.db_table
+        medicine_table = Medicine._meta.db_table
+        values = ', '.join(['(%s, %s)'] * len(quantities))
+        params = [value for line in quantities.items() for value in line]
+
+        with connections[write_db(self)].cursor() as cursor:
+            cursor.execute(f'''
+                INSERT INTO {table} (medicine_id, available, reserved, updated_at)
+                SELECT m.id, r.quantity, 0, now()
+                FROM (VALUES {values}) AS r (medicine_id, quantity) JOIN {medicine_table} m ON m.id = r.medicine_id
+                ON CONFLICT (medicine_id) DO UPDATE SET
+                    available = {table}.available + EXCLUDED.available,
+                    updated_at = EXCLUDED.updated_at
+                RETURNING medicine_id
+            ''', params)
+            return {row[0] for row in cursor.fetchall()}
+
+
+class Stock(models.Model):
+    medicine = models.OneToOneField(
+        Medicine,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stock'
+    )
+    available = models.PositiveIntegerField(
+        default=0,
+        help_text='Units which can be ordered'
+    )
+    reserved = models.PositiveIntegerField(
+        default=0,
+        help_text='Units of pending orders'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StockManager()
+
+    def __str__(self):
+        return f'{self.medicine_id} - {self.available} ({self.reserved} reserved)'
+
+    class Meta:
+        verbose_name = 'Stock'
+        verbose_name_plural = 'Stock'
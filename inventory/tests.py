@@ -0,0 +1,144 @@
+import threading
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from inventory.models import OutOfStock, Stock
+from medicines.models import Medicine
+from orders.models import Order
+from users.models import User
+
+
+class StockTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.aspirin = Medicine.objects.create(name='Aspirin', description='', price=100)
+        self.nurofen = Medicine.objects.create(name='Nurofen', description='', price=200)
+        Stock.objects.restock({self.aspirin.id: 5, self.nurofen.id: 1})
+
+    def assertStock(self, medicine, available, reserved):
+        stock = Stock.objects.get(medicine=medicine)
+        self.assertEqual((stock.available, stock.reserved), (available, reserved))
+
+    def test_shortfall_creates_nothing(self):
+        untracked = Medicine.objects.create(name='Citramon', description='', price=50)
+
+        response = self.client.post(reverse('create_order'), {
+            'address': 'Address',
+            'order_items': [
+                {'medicine_id': self.aspirin.id, 'quantity': 2},
+                {'medicine_id': self.nurofen.id, 'quantity': 2},
+                {'medicine_id': untracked.id, 'quantity': 1},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['out_of_stock_medicines'], [self.nurofen.id])
+        self.assertFalse(Order.objects.exists())
+        self.assertStock(self.aspirin, 5, 0)
+
+    def test_medicines_without_stock_are_not_tracked(self):
+        untracked = Medicine.objects.create(name='Citramon', description='', price=50)
+
+        order, _ = Order.objects.place(self.user, 'Address', [
+            {'medicine_id': self.aspirin.id, 'quantity': 2},
+            {'medicine_id': untracked.id, 'quantity': 100},
+        ])
+
+        self.assertEqual(order.items.count(), 2)
+        self.assertStock(self.aspirin, 3, 2)
+        self.assertFalse(Stock.objects.filter(medicine=untracked).exists())
+
+    def test_cancel_releases_and_delivery_ships(self):
+        items = [{'medicine_id': self.aspirin.id, 'quantity': 2}]
+        canceled, _ = Order.objects.place(self.user, 'Address', items)
+        delivered, _ = Order.objects.place(self.user, 'Address', items)
+        self.assertStock(self.aspirin, 1, 4)
+
+        with self.assertRaises(OutOfStock):
+            Order.objects.place(self.user, 'Address', items)
+
+        self.assertTrue(canceled.cancel_by_user('Changed my mind'))
+        self.assertFalse(canceled.cancel_by_user('Changed my mind'))
+        self.assertStock(self.aspirin, 3, 2)
+
+        self.assertEqual(Order.objects.filter(id=delivered.id).deliver(), [delivered.id])
+        self.assertStock(self.aspirin, 3, 0)
+
+    def test_restock_after_order_does_not_release_untracked_lines(self):
+        untracked = Medicine.objects.create(name='Citramon', description='', price=50)
+        items = [{'medicine_id': self.aspirin.id, 'quantity': 1}, {'medicine_id': untracked.id, 'quantity': 2}]
+        canceled, _ = Order.objects.place(self.user, 'Address', items)
+        delivered, _ = Order.objects.place(self.user, 'Address', items)
+        Stock.objects.restock({untracked.id: 3})
+
+        self.assertTrue(canceled.cancel_by_user('Changed my mind'))
+        self.assertEqual(Order.objects.filter(id=delivered.id).deliver(), [delivered.id])
+
+        self.assertStock(untracked, 3, 0)
+        self.assertStock(self.aspirin, 4, 0)
+
+    def test_restock_is_staff_only(self):
+        response = self.client.post(reverse('restock'), {'items': []}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(reverse('restock'), {'items': [
+            {'medicine_id': self.aspirin.id, 'quantity': 10},
+            {'medicine_id': 0, 'quantity': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.data['stock'], [{'medicine_id': self.aspirin.id, 'available': 15, 'reserved': 0}])
+        self.assertEqual(response.data['not_found_medicines'], [0])
+
+
+class StockConcurrencyTest(TransactionTestCase):
+    threads = 8
+    attempts = 5
+    available = 12
+
+    def test_hot_medicine_is_not_oversold_while_orders_are_canceled(self):
+        user = User.objects.create_user(username='user', phone='+77000000000')
+        medicine = Medicine.objects.create(name='Aspirin', description='', price=100)
+        other = Medicine.objects.create(name='Nurofen', description='', price=200)
+        Stock.objects.restock({medicine.id: self.available, other.id: self.threads * self.attempts})
+        barrier = threading.Barrier(self.threads)
+        errors = []
+
+        def worker(index):
+            # Baskets list the medicines in different orders, reservation must not deadlock.
+            # Half of the workers cancel the orders they get, releasing stock while the others reserve it
+            items = [{'medicine_id': medicine.id, 'quantity': 1}, {'medicine_id': other.id, 'quantity': 1}]
+            if index % 2:
+                items.reverse()
+            try:
+                barrier.wait()
+                for _ in range(self.attempts):
+                    try:
+                        order, _ = Order.objects.place(user, 'Address', items)
+                    except OutOfStock:
+                        continue
+                    if index % 4 < 2:
+                        order.cancel_by_user('Changed my mind')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=[i]) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        pending = Order.objects.filter(status=Order.Status.PENDING).count()
+        stock = Stock.objects.get(medicine=medicine)
+        self.assertLessEqual(pending, self.available)
+        self.assertEqual((stock.available, stock.reserved), (self.available - pending, pending))
+        self.assertEqual(Stock.objects.get(medicine=other).reserved, pending)
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from inventory.views import restock
+
+urlpatterns = [
+    path('/restock', restock, name='restock'),
+]
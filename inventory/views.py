@@ -0,0 +1,32 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from inventory.models import Stock
+from users.permissions.staff_permission import IsStaff
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsStaff])
+def restock(request):
+    """Add delivered units, items are [{medicine_id, quantity}]"""
+    quantities = {}
+    try:
+        for item in request.data['items']:
+            medicine_id = int(item['medicine_id'])
+            quantity = int(item['quantity'])
+            if quantity <= 0:
+                raise ValueError
+            quantities[medicine_id] = quantities.get(medicine_id, 0) + quantity
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': 'Every item needs medicine_id and a positive quantity'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    found = Stock.objects.restock(quantities)
+    stock = Stock.objects.filter(medicine_id__in=found).values('medicine_id', 'available', 'reserved')
+
+    return Response({
+        'stock': list(stock),
+        'not_found_medicines': [medicine_id for medicine_id in quantities if medicine_id not in found],
+    }, status=status.HTTP_200_OK)
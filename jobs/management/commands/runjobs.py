@@ -0,0 +1,91 @@
+import logging
+import os
+import select
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from jobs.models import Job
+from jobs.queue import CHANNEL, perform
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs with N concurrent workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=5,
+                            help='Seconds between checks for due jobs when no notification comes')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Seconds after which a running job is considered abandoned and queued again')
+        parser.add_argument('--burst', action='store_true', help='Exit once there are no due jobs')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        self.wakeup = threading.Condition()
+        # Written on shutdown, so the listener doesn't sit in select() for the whole poll interval
+        self.stop_reader, self.stop_writer = os.pipe()
+        self.poll_interval = options['poll_interval']
+        self.burst = options['burst']
+
+        if not self.burst:
+            signal.signal(signal.SIGTERM, self.shutdown)
+            signal.signal(signal.SIGINT, self.shutdown)
+
+        Job.objects.requeue_stale(options['stale_after'])
+        workers = [
+            threading.Thread(target=self.work, name=f'worker-{i}')
+            for i in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        if not self.burst:
+            self.listen(options['stale_after'])
+
+        for worker in workers:
+            worker.join()
+
+    def shutdown(self, *args):
+        self.stop.set()
+        os.write(self.stop_writer, b'x')
+        with self.wakeup:
+            self.wakeup.notify_all()
+
+    def listen(self, stale_after):
+        """Wake up idle workers on NOTIFY, the main thread only listens"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        listener = connection.connection
+
+        while not self.stop.is_set():
+            readable, _, _ = select.select([listener, self.stop_reader], [], [], self.poll_interval)
+            if listener in readable:
+                listener.poll()
+                listener.notifies.clear()
+            elif not readable:
+                Job.objects.requeue_stale(stale_after)
+
+            with self.wakeup:
+                self.wakeup.notify_all()
+
+    def work(self):
+        try:
+            while not self.stop.is_set():
+                claimed = Job.objects.claim()
+                if claimed is not None:
+                    perform(claimed)
+                elif self.burst:
+                    return
+                else:
+                    with self.wakeup:
+                        self.wakeup.wait(self.poll_interval)
+        except Exception:
+            logger.exception('Worker crashed')
+            self.shutdown()
+        finally:
+            connections.close_all()
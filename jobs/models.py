@@ -0,0 +1,79 @@
+import datetime
+
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class JobManager(models.Manager):
+    def claim(self):
+        """
+        Take the next due job, or None. SKIP LOCKED lets concurrent workers
+        pass over the rows another worker is claiming instead of waiting for it.
+        """
+        with transaction.atomic(using=self.db):
+            job = (
+                self.select_for_update(skip_locked=True)
+                .filter(status=Job.Status.QUEUED, run_at__lte=timezone.now())
+                .order_by('run_at', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+
+            job.status = Job.Status.RUNNING
+            job.attempts += 1
+            job.locked_at = timezone.now()
+            job.save(update_fields=['status', 'attempts', 'locked_at'])
+
+        return job
+
+    def requeue_stale(self, timeout):
+        """Put back jobs of workers which died while running them, returns their number"""
+        return self.filter(
+            status=Job.Status.RUNNING,
+            locked_at__lt=timezone.now() - datetime.timedelta(seconds=timeout)
+        ).update(status=Job.Status.QUEUED, locked_at=None)
+
+
+class Job(models.Model):
+    """Side effect queued by a request, run by `manage.py runjobs`. Finished jobs are deleted."""
+
+    class Status(models.TextChoices):
+        QUEUED = "QUEUED", _("QUEUED")
+        RUNNING = "RUNNING", _("RUNNING")
+        FAILED = "FAILED", _("FAILED")
+
+    name = models.CharField(
+        max_length=255,
+        help_text='Import path of the function decorated with @job'
+    )
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = JobManager()
+
+    def __str__(self):
+        return f'{self.name} - {self.status}'
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            # Workers only look at queued jobs, finished ones are deleted and failed ones are few
+            models.Index(
+                fields=['run_at', 'id'],
+                condition=models.Q(status='QUEUED'),
+                name='job_queue_idx'
+            ),
+        ]
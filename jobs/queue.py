@@ -0,0 +1,88 @@
+"""
+Durable job queue on top of the jobs_job table.
+
+    @job(max_attempts=3)
+    def send_receipt(order_id):
+        ...
+
+    send_receipt.enqueue(order_id=order.id)
+
+The job row is inserted in the caller's transaction, so a worker sees it only after
+the transaction commits and never if it is rolled back. Payloads must be JSON.
+Jobs run at least once: a job of a worker that died is run again, so they must be idempotent.
+A job declared with unique=True isn't queued again while the same call is still waiting to run.
+"""
+import datetime
+import logging
+import random
+import traceback
+
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'jobs'
+BACKOFF_BASE = 5  # seconds, doubled after every failed attempt
+BACKOFF_MAX = 60 * 60
+
+
+def job(max_attempts=5, unique=False):
+    """Register the function as a job, it gets .enqueue(**payload)"""
+    def decorator(func):
+        func.job_name = f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        func.unique = unique
+        func.enqueue = lambda **payload: enqueue(func, **payload)
+        return func
+
+    return decorator
+
+
+def enqueue(func, **payload):
+    db = router.db_for_write(Job)
+    if func.unique:
+        # A running job may have read the old data already, so only a queued one makes this call redundant
+        pending = Job.objects.using(db).filter(name=func.job_name, payload=payload, status=Job.Status.QUEUED).first()
+        if pending is not None:
+            return pending
+
+    queued = Job.objects.using(db).create(name=func.job_name, payload=payload, max_attempts=func.max_attempts)
+
+    # NOTIFY is delivered when the transaction commits, it wakes up idle workers
+    with connections[db].cursor() as cursor:
+        cursor.execute(f'NOTIFY {CHANNEL}')
+
+    return queued
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return datetime.timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def perform(claimed):
+    """Run a claimed job, delete it if it succeeded, otherwise schedule a retry or mark it failed"""
+    try:
+        func = import_string(claimed.name)
+        if getattr(func, 'job_name', None) != claimed.name:
+            raise ValueError(f'{claimed.name} is not a job')
+        func(**claimed.payload)
+    except Exception:
+        logger.exception('Job %s #%s failed, attempt %s of %s',
+                         claimed.name, claimed.id, claimed.attempts, claimed.max_attempts)
+        claimed.last_error = traceback.format_exc()
+        claimed.locked_at = None
+        if claimed.attempts >= claimed.max_attempts:
+            claimed.status = Job.Status.FAILED
+        else:
+            claimed.status = Job.Status.QUEUED
+            claimed.run_at = timezone.now() + backoff(claimed.attempts)
+        claimed.save(update_fields=['status', 'run_at', 'locked_at', 'last_error'])
+        return False
+
+    claimed.delete()
+    return True
@@ -0,0 +1,101 @@
+import datetime
+
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import job, perform
+
+calls = []
+
+
+@job(max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@job(max_attempts=2, unique=True)
+def record_once(value):
+    calls.append(value)
+
+
+@job(max_attempts=2)
+def explode():
+    raise RuntimeError('Boom')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_takes_due_jobs_in_order(self):
+        later = record.enqueue(value='later')
+        later.run_at = timezone.now() + datetime.timedelta(minutes=1)
+        later.save()
+        first = record.enqueue(value='first')
+        second = record.enqueue(value='second')
+
+        self.assertEqual(Job.objects.claim(), first)
+        self.assertEqual(Job.objects.claim(), second)
+        self.assertIsNone(Job.objects.claim())
+
+    def test_perform_deletes_finished_jobs(self):
+        record.enqueue(value=1)
+
+        self.assertTrue(perform(Job.objects.claim()))
+
+        self.assertEqual(calls, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        explode.enqueue()
+
+        self.assertFalse(perform(Job.objects.claim()))
+        retried = Job.objects.get()
+        self.assertEqual(retried.status, Job.Status.QUEUED)
+        self.assertGreater(retried.run_at, timezone.now())
+        self.assertIn('Boom', retried.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        perform(Job.objects.claim())
+        self.assertEqual(Job.objects.get().status, Job.Status.FAILED)
+
+    def test_rolled_back_job_is_not_queued(self):
+        with transaction.atomic():
+            record.enqueue(value=1)
+            transaction.set_rollback(True)
+
+        self.assertFalse(Job.objects.exists())
+
+    def test_unique_job_is_queued_once_until_it_runs(self):
+        first = record_once.enqueue(value=1)
+        self.assertEqual(record_once.enqueue(value=1), first)
+        record_once.enqueue(value=2)
+        self.assertEqual(Job.objects.count(), 2)
+
+        claimed = Job.objects.claim()
+        self.assertNotEqual(record_once.enqueue(value=1), first)
+        perform(claimed)
+        self.assertEqual(Job.objects.filter(payload={'value': 1}).count(), 1)
+
+    def test_stale_jobs_are_requeued(self):
+        record.enqueue(value=1)
+        Job.objects.claim()
+        Job.objects.update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+
+        self.assertEqual(Job.objects.requeue_stale(600), 1)
+        self.assertIsNotNone(Job.objects.claim())
+
+
+class RunJobsTest(TransactionTestCase):
+    def test_workers_run_every_job_once(self):
+        calls.clear()
+        for i in range(20):
+            record.enqueue(value=i)
+
+        call_command('runjobs', concurrency=4, burst=True)
+
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,60 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from medicines.models import Medicine
+from medicines.serializers import MedicineSerializer
+
+
+def refresh_cards(medicine_ids):
+    """Render and store cards of medicines, returns {id: card}"""
+    # Read from the primary in the transaction, a card rendered from a lagging replica would be stored stale
+    with transaction.atomic():
+        medicines = list(
+            Medicine.objects.filter(pk__in=medicine_ids).defer('search_vector', 'card').with_card_relations()
+        )
+        for medicine in medicines:
+            # Image URLs stay relative in the card, they are made absolute per request
+            medicine.card = dict(MedicineSerializer(medicine).data)
+
+        Medicine.objects.bulk_update(medicines, ['card'])
+
+    return {medicine.pk: medicine.card for medicine in medicines}
+
+
+def _missing_cards(rows, id_field, card_field):
+    return [row[id_field] for row in rows if row[card_field] is None]
+
+
+def _absolute_cards(rows, rendered, request, id_field, card_field):
+    cards = []
+    for row in rows:
+        card = row[card_field] or rendered.get(row[id_field])
+        if card is None:
+            continue
+        if card['image']:
+            card['image'] = request.build_absolute_uri(card['image'])
+        for formats in (card.get('image_variants') or {}).values():
+            for stored in formats.values():
+                stored['url'] = request.build_absolute_uri(stored['url'])
+        cards.append(card)
+
+    return cards
+
+
+def build_cards(rows, request, id_field='id', card_field='card'):
+    """
+    Return cards of the rows fetched with `values()`, in the same order.
+    Rows saved before cards existed are rendered once and stored.
+    """
+    missing = _missing_cards(rows, id_field, card_field)
+    rendered = refresh_cards(missing) if missing else {}
+
+    return _absolute_cards(rows, rendered, request, id_field, card_field)
+
+
+async def abuild_cards(rows, request, id_field='id', card_field='card'):
+    """build_cards() for async views, only rendering missing cards leaves the event loop"""
+    missing = _missing_cards(rows, id_field, card_field)
+    rendered = await sync_to_async(refresh_cards)(missing) if missing else {}
+
+    return _absolute_cards(rows, rendered, request, id_field, card_field)
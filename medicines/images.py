@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+
+from jobs.queue import job
+from medicines.cards import refresh_cards
+from medicines.models import Medicine
+from utils.media import get_process_pool, render_image_variants
+
+# Variant: width in pixels, list and detail are the sizes the apps render at 1x
+IMAGE_VARIANTS = {
+    'list': 320,
+    'list_2x': 640,
+    'detail': 1024,
+    'detail_2x': 2048,
+}
+IMAGE_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+VARIANTS_DIRECTORY = 'media/medicine/variants'
+
+
+def needs_variants(medicine):
+    return bool(medicine.image) and (medicine.image_variants or {}).get('source') != medicine.image.name
+
+
+def variant_names(image_name):
+    """Storage names of the variants, they change together with the source image"""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    digest = hashlib.md5(image_name.encode()).hexdigest()[:8]
+    return {
+        (variant, extension): f'{VARIANTS_DIRECTORY}/{stem}-{digest}-{variant}.{extension}'
+        for variant in IMAGE_VARIANTS
+        for extension in IMAGE_FORMATS
+    }
+
+
+def delete_variants(image_variants):
+    """Delete variant files unless a medicine still shows their source, blobs may be shared"""
+    if not image_variants or Medicine.objects.filter(image=image_variants['source']).exists():
+        return
+
+    for variant, formats in image_variants.items():
+        if variant == 'source':
+            continue
+        for stored in formats.values():
+            default_storage.delete(stored['name'])
+
+
+@job(max_attempts=3, unique=True)
+def generate_image_variants(medicine_id):
+    medicine = Medicine.objects.filter(pk=medicine_id).only('id', 'image', 'image_variants').first()
+    if medicine is None or not needs_variants(medicine):
+        return
+
+    # Medicines sharing a stored image share its variants too
+    shared = (
+        Medicine.objects.filter(image=medicine.image.name, image_variants__source=medicine.image.name)
+        .exclude(pk=medicine_id)
+        .values_list('image_variants', flat=True)
+        .first()
+    )
+    image_variants = shared or render_variants(medicine.image)
+
+    # The image may have been replaced meanwhile, its own job renders the new one
+    updated = Medicine.objects.filter(pk=medicine_id, image=medicine.image.name).update(image_variants=image_variants)
+    if not updated:
+        delete_variants(image_variants)
+        return
+
+    delete_variants(medicine.image_variants)
+    refresh_cards([medicine_id])
+
+
+def render_variants(image):
+    names = variant_names(image.name)
+    targets = [
+        (default_storage.path(name), IMAGE_VARIANTS[variant], IMAGE_FORMATS[extension])
+        for (variant, extension), name in names.items()
+    ]
+    metadata = get_process_pool().submit(render_image_variants, image.path, targets).result()
+
+    image_variants = {'source': image.name}
+    for ((variant, extension), name), (width, height, size) in zip(names.items(), metadata):
+        image_variants.setdefault(variant, {})[extension] = {
+            'name': name,
+            'width': width,
+            'height': height,
+            'size': size,
+        }
+
+    return image_variants
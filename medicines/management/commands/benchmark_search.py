@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from categories.models import Category
+from medicines.models import Medicine
+from medicines.search import search_medicines, search_vector
+from symptoms.models import Symptom
+
+SYLLABLES = ['ab', 'ac', 'al', 'am', 'an', 'ar', 'ci', 'da', 'de', 'do', 'fe', 'in', 'ko', 'lo', 'ma', 'mi',
+             'na', 'no', 'ol', 'pa', 'ra', 're', 'ri', 'sa', 'so', 'ta', 'te', 'ti', 'to', 'va', 'xi', 'zo']
+WORDS = ['tablets', 'syrup', 'drops', 'capsules', 'ointment', 'forte', 'extra', 'kids', 'rapid', 'retard']
+QUERIES = ['paracetamol', 'paracetmol', 'para', 'headache', 'syrup kids', 'ibuprofen forte']
+
+
+class Command(BaseCommand):
+    help = 'Compare latency of the ILIKE search with the full-text/trigram search on a seeded catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--medicines', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # Everything is seeded inside a transaction which is rolled back at the end
+        with transaction.atomic():
+            self.seed(options['medicines'])
+            for query in QUERIES:
+                ilike = self.measure(
+                    lambda: list(Medicine.objects.filter(name__icontains=query).order_by('name', 'id')[:options['page']]),
+                    options['repeat'],
+                )
+                engine = self.measure(
+                    lambda: list(search_medicines(Medicine.objects.defer('search_vector'), query)
+                                 .order_by('-rank', 'id')[:options['page']]),
+                    options['repeat'],
+                )
+                self.stdout.write(
+                    f'{query!r:20} ilike p50={ilike[0]:.2f}ms p95={ilike[1]:.2f}ms | '
+                    f'search p50={engine[0]:.2f}ms p95={engine[1]:.2f}ms'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        self.stdout.write(f'Seeding {count} medicines...')
+        random.seed(0)
+        categories = [Category.objects.create(name=f'Benchmark category {i}') for i in range(20)]
+        symptoms = [Symptom.objects.create(name=name, description='') for name in ('headache', 'fever', 'cough', 'allergy')]
+
+        medicines = []
+        for i in range(count):
+            name = ''.join(random.choices(SYLLABLES, k=random.randint(3, 6))).capitalize()
+            medicines.append(Medicine(
+                name=f'{name} {random.choice(WORDS)}',
+                description=' '.join(random.choices(WORDS + SYLLABLES, k=12)),
+                price=random.randint(100, 20000),
+                category=random.choice(categories),
+            ))
+        for name in ('Paracetamol 500', 'Paracetamol syrup kids', 'Ibuprofen forte'):
+            medicines.append(Medicine(name=name, description='', price=500, category=categories[0]))
+        Medicine.objects.bulk_create(medicines, batch_size=5000)
+
+        through = Medicine.symptoms.through
+        ids = Medicine.objects.values_list('id', flat=True)
+        through.objects.bulk_create(
+            [through(medicine_id=medicine_id, symptom_id=random.choice(symptoms).id) for medicine_id in ids],
+            batch_size=5000,
+        )
+        Medicine.objects.update(search_vector=search_vector())
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @staticmethod
+    def measure(run, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
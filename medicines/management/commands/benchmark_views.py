@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from cart.models import Cart
+from categories.models import Category
+from medicines.models import Medicine
+from users.models import User
+
+DEFAULT_SERVER = 'daphne -b 127.0.0.1 -p {port} project.asgi:application'
+MODES = {'sync': '0', 'async': '1'}
+
+
+async def send(reader, writer, request):
+    """One request on a keep-alive connection, returns (status, whether the server closes the connection)"""
+    writer.write(request)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by the server')
+    status = int(status_line.split()[1])
+
+    length = None
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            close = value.strip().lower() == 'close'
+        elif name == 'transfer-encoding':
+            raise CommandError('Chunked responses are not supported by the benchmark client')
+
+    if length is None:
+        await reader.read()
+        close = True
+    else:
+        await reader.readexactly(length)
+
+    return status, close
+
+
+async def load(port, request, concurrency, duration):
+    """Keep `concurrency` connections busy for `duration` seconds, returns (latencies in ms, errors, elapsed)"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        connection = None
+        while time.perf_counter() < deadline:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            start = time.perf_counter()
+            try:
+                status, close = await send(*connection, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection[1].close()
+                connection = None
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                errors += 1
+            if close:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = 'Compare latency and throughput of the sync and async list views served by daphne'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', default=DEFAULT_SERVER, help='Command starting the server, {port} is replaced')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per endpoint and concurrency')
+        parser.add_argument('--medicines', type=int, default=200)
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+
+    def handle(self, *args, **options):
+        # The server is another process, so the data has to be committed and is deleted at the end
+        user, medicines, categories = self.seed(options['medicines'])
+        try:
+            token = Token.objects.create(user=user).key
+            requests = self.requests(token)
+            best = {}
+            for mode in options['modes']:
+                with self.server(options['server'], options['port'], MODES[mode]):
+                    for endpoint, request in requests.items():
+                        for concurrency in options['concurrency']:
+                            rps = self.run(mode, endpoint, request, concurrency, options)
+                            best[mode, endpoint] = max(best.get((mode, endpoint), 0), rps)
+
+            for endpoint in requests:
+                self.stdout.write(f'{endpoint:>10} max rps: ' + ' '.join(
+                    f'{mode}={best[mode, endpoint]:.0f}' for mode in options['modes']
+                ))
+        finally:
+            Medicine.objects.filter(pk__in=[medicine.pk for medicine in medicines]).delete()
+            Category.objects.filter(pk__in=[category.pk for category in categories]).delete()
+            user.delete()
+
+    def seed(self, count):
+        user = User.objects.create_user(username='benchmark-views', phone='+70000000999')
+        categories = [Category.objects.create(name=f'Benchmark views category {i}') for i in range(20)]
+        medicines = [
+            Medicine.objects.create(
+                name=f'Benchmark views medicine {i}', description='', price=100 + i,
+                category=categories[i % len(categories)]
+            )
+            for i in range(count)
+        ]
+        Cart.objects.bulk_create([Cart(user=user, medicine=medicine, quantity=2) for medicine in medicines[:10]])
+        return user, medicines, categories
+
+    @staticmethod
+    def requests(token):
+        def build(method, path, body=None):
+            body = json.dumps(body).encode() if body is not None else b''
+            head = (
+                f'{method} {path} HTTP/1.1\r\n'
+                f'Host: 127.0.0.1\r\n'
+                f'Authorization: Token {token}\r\n'
+                f'Accept: application/json\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'\r\n'
+            )
+            return head.encode() + body
+
+        return {
+            'medicines': build('POST', reverse('get_medicines'), {'limit': 20}),
+            'cart': build('GET', reverse('get_cart')),
+            'categories': build('GET', reverse('get_categories')),
+        }
+
+    @contextmanager
+    def server(self, command, port, async_views):
+        process = subprocess.Popen(
+            shlex.split(command.format(port=port)), env={**os.environ, 'ASYNC_VIEWS': async_views},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                if process.poll() is not None:
+                    raise CommandError(f'Server exited with {process.returncode}: {command}')
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise CommandError(f'Server did not start listening on port {port}')
+                    time.sleep(0.2)
+            yield
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def run(self, mode, endpoint, request, concurrency, options):
+        # Warms up connections, caches and the token cache of the server
+        asyncio.run(load(options['port'], request, concurrency, 1))
+        latencies, errors, elapsed = asyncio.run(load(options['port'], request, concurrency, options['duration']))
+
+        rps = len(latencies) / elapsed
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{mode:>5} {endpoint:>10} c={concurrency:<3}: {rps:.0f} rps '
+            f'p50={quantiles[49]:.2f}ms p99={quantiles[98]:.2f}ms errors={errors}'
+        )
+        return rps
@@ -0,0 +1,29 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from utils.media import extract_metadata_many
+
+
+class Command(BaseCommand):
+    help = 'Print metadata of media files as JSON lines, directories are walked recursively'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+
+    def handle(self, *args, **options):
+        for path, metadata in extract_metadata_many(self.walk(options['paths'])):
+            if isinstance(metadata, Exception):
+                metadata = {'error': str(metadata)}
+            self.stdout.write(json.dumps({'path': path, **metadata}))
+
+    @staticmethod
+    def walk(paths):
+        for path in paths:
+            if not os.path.isdir(path):
+                yield path
+                continue
+            for directory, _, names in os.walk(path):
+                for name in sorted(names):
+                    yield os.path.join(directory, name)
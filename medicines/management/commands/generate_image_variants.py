@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from medicines.images import generate_image_variants, needs_variants
+from medicines.models import Medicine
+
+
+class Command(BaseCommand):
+    help = 'Queue image variant jobs for medicines whose variants are missing or outdated'
+
+    def handle(self, *args, **options):
+        medicines = Medicine.objects.exclude(image='').only('id', 'image', 'image_variants')
+
+        queued = 0
+        with transaction.atomic():
+            for medicine in medicines.iterator():
+                if needs_variants(medicine):
+                    generate_image_variants.enqueue(medicine_id=medicine.id)
+                    queued += 1
+
+        self.stdout.write(f'Queued {queued} medicines')
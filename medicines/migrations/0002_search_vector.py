@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:22
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+BACKFILL_SEARCH_VECTOR = '''
+UPDATE medicines_medicine m SET search_vector =
+    setweight(to_tsvector('russian', COALESCE(m.name, '')), 'A')
+    || setweight(to_tsvector('russian', COALESCE(
+        (SELECT c.name FROM categories_category c WHERE c.id = m.category_id), ''
+    )), 'B')
+    || setweight(to_tsvector('russian', COALESCE(
+        (SELECT string_agg(s.name, ' ') FROM symptoms_symptom s
+         JOIN medicines_medicine_symptoms ms ON ms.symptom_id = s.id
+         WHERE ms.medicine_id = m.id), ''
+    )), 'B')
+    || setweight(to_tsvector('russian', COALESCE(m.description, '')), 'C');
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('medicines', '0001_initial'),
+        ('symptoms', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='medicine',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Weighted name, category, symptoms and description, maintained by signals', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='medicine_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='medicine_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunSQL(BACKFILL_SEARCH_VECTOR, migrations.RunSQL.noop),
+    ]
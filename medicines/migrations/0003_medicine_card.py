@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0002_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='card',
+            field=models.JSONField(editable=False, help_text='Rendered MedicineSerializer data, maintained by signals', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('medicines', '0003_medicine_card'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='medicine',
+            name='category',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medicines', to='categories.category'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['name', 'id'], name='medicine_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['price', 'id'], name='medicine_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['category', 'price', 'id'], name='medicine_category_price_idx'),
+        ),
+        # Auto-created through table, the index can't be declared on a model
+        migrations.RunSQL(
+            'CREATE INDEX medicine_symptoms_symptom_medicine_idx '
+            'ON medicines_medicine_symptoms (symptom_id, medicine_id);',
+            'DROP INDEX medicine_symptoms_symptom_medicine_idx;',
+        ),
+    ]
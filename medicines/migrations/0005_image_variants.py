@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0004_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='image_variants',
+            field=models.JSONField(editable=False, help_text='Resized copies of image with their dimensions, generated by a job', null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:48
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0005_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='medicine',
+            name='image',
+            field=models.ImageField(storage=utils.storage.get_blob_storage, upload_to='media/medicine'),
+        ),
+    ]
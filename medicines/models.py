@@ -1,23 +1,54 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import Prefetch
 
 from categories.models import Category
 from symptoms.models import Symptom
+from utils.storage import get_blob_storage
+
+
+class MedicineQuerySet(models.QuerySet):
+    def with_card_relations(self):
+        """Load category and the newest three symptoms of every medicine in two queries"""
+        last_three_symptoms = Symptom.objects.order_by('-id')[:3]
+        return self.select_related('category').prefetch_related(
+            Prefetch('symptoms', queryset=last_three_symptoms, to_attr='prefetched_last_three_symptoms')
+        )
 
 
 class Medicine(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    image = models.ImageField(upload_to='media/medicine')
+    image = models.ImageField(upload_to='media/medicine', storage=get_blob_storage)
     symptoms = models.ManyToManyField(Symptom, related_name='medicines')
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
         related_name='medicines',
-        null=True
+        null=True,
+        db_index=False  # covered by medicine_category_price_idx
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        help_text='Weighted name, category, symptoms and description, maintained by signals'
+    )
+    card = models.JSONField(
+        null=True,
+        editable=False,
+        help_text='Rendered MedicineSerializer data, maintained by signals'
+    )
+    image_variants = models.JSONField(
+        null=True,
+        editable=False,
+        help_text='Resized copies of image with their dimensions, generated by a job'
+    )
+
+    objects = MedicineQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.name} - {self.price}'
@@ -25,6 +56,11 @@ class Medicine(models.Model):
     class Meta:
         verbose_name = 'Medicine'
         verbose_name_plural = 'Medicines'
-
-
-
+        indexes = [
+            # Keyset pagination orderings and the catalog filters
+            models.Index(fields=['name', 'id'], name='medicine_name_id_idx'),
+            models.Index(fields=['price', 'id'], name='medicine_price_id_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='medicine_category_price_idx'),
+            GinIndex(fields=['search_vector'], name='medicine_search_vector_idx'),
+            GinIndex(fields=['name'], name='medicine_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
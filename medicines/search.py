@@ -0,0 +1,58 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity, TrigramWordSimilarity
+)
+from django.db.models import F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Greatest
+
+from categories.models import Category
+from medicines.models import Medicine
+from symptoms.models import Symptom
+
+# "russian" stems cyrillic words and falls back to the english stemmer for latin ones
+SEARCH_CONFIG = 'russian'
+
+
+def search_vector():
+    """Weighted tsvector of medicine: name > category, symptoms > description"""
+    category_name = Category.objects.filter(pk=OuterRef('category_id')).values('name')
+    symptom_names = (
+        Symptom.objects.filter(medicines=OuterRef('pk'))
+        .values('medicines')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')
+    )
+
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(category_name), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(Subquery(symptom_names), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(medicine_ids):
+    """Recompute search vectors of medicines in one UPDATE"""
+    Medicine.objects.filter(pk__in=medicine_ids).update(search_vector=search_vector())
+
+
+def search_medicines(medicines, search):
+    """
+    Filter medicines by full-text match or typo-tolerant trigram match on name,
+    annotating every row with its relevance as `rank`.
+    Word similarity catches typed prefixes ("parac"), plain similarity catches typos ("asprin").
+    """
+    query = SearchQuery(search, search_type='websearch', config=SEARCH_CONFIG)
+
+    return medicines.filter(
+        Q(search_vector=query) | Q(name__trigram_similar=search) | Q(name__trigram_word_similar=search)
+    ).annotate(
+        # Ranks are real, cast to double so the value survives a round trip through a keyset cursor
+        rank=Cast(
+            SearchRank(F('search_vector'), query) + Greatest(
+                TrigramSimilarity('name', search),
+                TrigramWordSimilarity(search, 'name'),
+            ),
+            FloatField()
+        )
+    )
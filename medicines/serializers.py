@@ -1,3 +1,4 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
 from categories.serializers import CategorySerializer
@@ -8,11 +9,36 @@ class MedicineSerializer(serializers.ModelSerializer):
     last_three_symptoms = serializers.SerializerMethodField('get_last_three_symptoms', read_only=True)
     category = serializers.SerializerMethodField('get_category', read_only=True)
     image = serializers.SerializerMethodField('get_image', read_only=True)
+    image_variants = serializers.SerializerMethodField('get_image_variants', read_only=True)
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
 
     def get_image(self, obj):
-        if obj.image:
-            return self.context.get('request').build_absolute_uri(obj.image.url)
-        return None
+        if not obj.image:
+            return None
+        return self.build_url(obj.image.url)
+
+    def get_image_variants(self, obj):
+        """{variant: {format: {url, width, height}}}, None until they are generated"""
+        if not obj.image_variants or obj.image_variants.get('source') != obj.image.name:
+            return None
+
+        return {
+            variant: {
+                extension: {
+                    'url': self.build_url(default_storage.url(stored['name'])),
+                    'width': stored['width'],
+                    'height': stored['height'],
+                }
+                for extension, stored in formats.items()
+            }
+            for variant, formats in obj.image_variants.items()
+            if variant != 'source'
+        }
 
     @staticmethod
     def get_category(obj):
@@ -24,7 +50,9 @@ class MedicineSerializer(serializers.ModelSerializer):
     @staticmethod
     def get_last_three_symptoms(obj):
         """Set last three symptom's name of medicine"""
-        symptoms = obj.symptoms.all().order_by('-id')[:3]
+        symptoms = getattr(obj, 'prefetched_last_three_symptoms', None)
+        if symptoms is None:
+            symptoms = obj.symptoms.all().order_by('-id')[:3]
         names = [symptom.name for symptom in symptoms]
         return names
 
@@ -36,6 +64,7 @@ class MedicineSerializer(serializers.ModelSerializer):
             'description',
             'price',
             'image',
+            'image_variants',
             'last_three_symptoms',
             'category',
             'created_at',
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from categories.models import Category
+from medicines.cards import refresh_cards
+from medicines.images import generate_image_variants, needs_variants
+from medicines.models import Medicine
+from medicines.search import refresh_search_vectors
+from medicines.suggest import suggest_index
+from symptoms.models import Symptom
+from utils.storage import track_blob_references
+
+
+track_blob_references(Medicine, 'image')
+
+
+def refresh_medicines(medicine_ids):
+    """Rebuild denormalized data of medicines"""
+    medicine_ids = list(medicine_ids)
+    if not medicine_ids:
+        return
+
+    refresh_search_vectors(medicine_ids)
+    refresh_cards(medicine_ids)
+
+
+@receiver(post_save, sender=Medicine)
+def medicine_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_medicines([instance.pk])
+    if needs_variants(instance):
+        generate_image_variants.enqueue(medicine_id=instance.pk)
+
+    medicine_id, name = instance.pk, instance.name
+    transaction.on_commit(lambda: suggest_index.update(medicine_id, name))
+
+
+@receiver(post_delete, sender=Medicine)
+def medicine_deleted(sender, instance, **kwargs):
+    medicine_id = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove(medicine_id))
+
+
+@receiver(m2m_changed, sender=Medicine.symptoms.through)
+def medicine_symptoms_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Symptom is cleared from all of its medicines, remember them before the rows are gone
+        instance._cleared_medicine_ids = list(instance.medicines.values_list('id', flat=True))
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        refresh_medicines([instance.pk])
+    elif action == 'post_clear':
+        refresh_medicines(getattr(instance, '_cleared_medicine_ids', []))
+    else:
+        refresh_medicines(pk_set)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    refresh_medicines(instance.medicines.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Symptom)
+def symptom_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    refresh_medicines(instance.medicines.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=Symptom)
+def related_pre_delete(sender, instance, **kwargs):
+    instance._deleted_medicine_ids = list(instance.medicines.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Symptom)
+def related_post_delete(sender, instance, **kwargs):
+    refresh_medicines(getattr(instance, '_deleted_medicine_ids', []))
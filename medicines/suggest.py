@@ -0,0 +1,96 @@
+import bisect
+import threading
+
+from medicines.models import Medicine
+
+
+def normalize(text):
+    return ' '.join(text.casefold().replace('ё', 'е').split())
+
+
+def name_keys(name):
+    """Every word start of the name is a key, so "forte" finds "Ibuprofen forte" too"""
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class PrefixIndex:
+    """
+    Per-process prefix index of medicine names.
+    Entries are (key, id, name) tuples in a sorted list searched with bisect,
+    the index is loaded with one query on first use and then kept up to date by signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+        self._keys_by_id = {}
+        self._loaded = False
+
+    def _load(self):
+        entries = []
+        keys_by_id = {}
+        for medicine_id, name in Medicine.objects.values_list('id', 'name'):
+            keys = name_keys(name)
+            keys_by_id[medicine_id] = (name, keys)
+            entries.extend((key, medicine_id, name) for key in keys)
+
+        entries.sort()
+        self._entries = entries
+        self._keys_by_id = keys_by_id
+        self._loaded = True
+
+    def suggest(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            suggestions = []
+            seen = set()
+            position = bisect.bisect_left(self._entries, (prefix,))
+            while position < len(self._entries) and len(suggestions) < limit:
+                key, medicine_id, name = self._entries[position]
+                if not key.startswith(prefix):
+                    break
+                if medicine_id not in seen:
+                    seen.add(medicine_id)
+                    suggestions.append({'id': medicine_id, 'name': name})
+                position += 1
+
+        return suggestions
+
+    def _remove(self, medicine_id):
+        name, keys = self._keys_by_id.pop(medicine_id, (None, []))
+        for key in keys:
+            position = bisect.bisect_left(self._entries, (key, medicine_id, name))
+            if position < len(self._entries) and self._entries[position] == (key, medicine_id, name):
+                del self._entries[position]
+
+    def update(self, medicine_id, name):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(medicine_id)
+            keys = name_keys(name)
+            self._keys_by_id[medicine_id] = (name, keys)
+            for key in keys:
+                bisect.insort(self._entries, (key, medicine_id, name))
+
+    def remove(self, medicine_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(medicine_id)
+
+    def clear(self):
+        """Drop the index, it will be loaded again on the next suggest"""
+        with self._lock:
+            self._entries = []
+            self._keys_by_id = {}
+            self._loaded = False
+
+
+suggest_index = PrefixIndex()
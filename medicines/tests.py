@@ -1,3 +1,295 @@
-from django.test import TestCase
+import io
+import os
+import random
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from categories.models import Category
+from jobs.models import Job
+from jobs.queue import perform
+from medicines.models import Medicine
+from medicines.suggest import suggest_index
+from symptoms.models import Symptom
+from users.authentication import token_cache
+from users.models import User
+
+
+class GetMedicinesTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Painkillers')
+        self.symptoms = [
+            Symptom.objects.create(name=f'Symptom {i}', description='')
+            for i in range(5)
+        ]
+
+    def create_medicines(self, count):
+        for i in range(count):
+            medicine = Medicine.objects.create(
+                name=f'Medicine {i}',
+                description='',
+                price=100 + i,
+                category=self.category
+            )
+            medicine.symptoms.set(self.symptoms)
+
+    def test_query_count_does_not_depend_on_number_of_medicines(self):
+        self.create_medicines(2)
+        with self.assertNumQueries(1):
+            small = self.client.post(reverse('get_medicines'), {}, format='json')
+
+        self.create_medicines(20)
+        with self.assertNumQueries(1):
+            large = self.client.post(reverse('get_medicines'), {'limit': 100}, format='json')
+
+        self.assertEqual(len(small.data['medicines']), 2)
+        self.assertEqual(len(large.data['medicines']), 22)
+
+    def test_last_three_symptoms_are_newest(self):
+        self.create_medicines(1)
+
+        response = self.client.post(reverse('get_medicines'), {}, format='json')
+
+        medicine = response.data['medicines'][0]
+        self.assertEqual(medicine['last_three_symptoms'], ['Symptom 4', 'Symptom 3', 'Symptom 2'])
+        self.assertEqual(medicine['category'], {'id': self.category.id, 'name': 'Painkillers'})
+
+    def test_cursor_pagination_walks_all_pages(self):
+        self.create_medicines(7)
+        Medicine.objects.filter(name__in=['Medicine 1', 'Medicine 2']).update(price=100)
+
+        ids = []
+        cursor = None
+        while True:
+            response = self.client.post(reverse('get_medicines'), {
+                'ordering': 'price',
+                'price_from': 100,
+                'symptoms_ids': [self.symptoms[0].id],
+                'limit': 3,
+                'cursor': cursor,
+            }, format='json')
+            ids += [medicine['id'] for medicine in response.data['medicines']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+
+        expected = Medicine.objects.order_by('price', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    def test_invalid_cursor(self):
+        for cursor in ('broken', 12, [1, 2], {'id': 1}, True):
+            response = self.client.post(reverse('get_medicines'), {'cursor': cursor}, format='json')
+
+            self.assertEqual(response.status_code, 400, cursor)
+
+    def search(self, search):
+        response = self.client.post(reverse('get_medicines'), {'search': search}, format='json')
+        return [medicine['name'] for medicine in response.data['medicines']]
+
+    def test_search_ranks_name_matches_first(self):
+        headache = Symptom.objects.create(name='Headache', description='')
+        aspirin = Medicine.objects.create(name='Aspirin', description='Helps with fever', price=10)
+        aspirin.symptoms.add(headache)
+        Medicine.objects.create(name='Citramon', description='Aspirin, paracetamol and caffeine', price=20)
+
+        self.assertEqual(self.search('aspirin'), ['Aspirin', 'Citramon'])
+        self.assertEqual(self.search('headache'), ['Aspirin'])
+        self.assertEqual(self.search('asprin'), ['Aspirin'])
+
+    def test_search_vector_follows_related_changes(self):
+        medicine = Medicine.objects.create(name='Nurofen', description='', price=10, category=self.category)
+        medicine.symptoms.add(self.symptoms[0])
+
+        self.category.name = 'Analgesics'
+        self.category.save()
+        self.symptoms[0].medicines.clear()
+
+        self.assertEqual(self.search('analgesics'), ['Nurofen'])
+        self.assertEqual(self.search('"Symptom 0"'), [])
+
+    def test_cards_follow_related_changes(self):
+        self.create_medicines(1)
+        Medicine.objects.update(card=None)
+
+        response = self.client.post(reverse('get_medicines'), {}, format='json')
+        self.assertEqual(response.data['medicines'][0]['category']['name'], 'Painkillers')
+        self.assertIsNotNone(Medicine.objects.get().card)
+
+        self.category.name = 'Analgesics'
+        self.category.save()
+        self.symptoms[4].delete()
+
+        response = self.client.post(reverse('get_medicines'), {}, format='json')
+        medicine = response.data['medicines'][0]
+        self.assertEqual(medicine['category']['name'], 'Analgesics')
+        self.assertEqual(medicine['last_three_symptoms'], ['Symptom 3', 'Symptom 2', 'Symptom 1'])
+
+    def test_token_requests_are_served_by_the_async_view(self):
+        self.create_medicines(3)
+        expected = self.client.post(reverse('get_medicines'), {'ordering': '-price', 'limit': 2}, format='json')
+        token_cache.clear()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+        with mock.patch('medicines.views.paginate_keyset', side_effect=AssertionError('sync view called')):
+            response = client.post(reverse('get_medicines'), {'ordering': '-price', 'limit': 2}, format='json')
+            unknown = client.post(reverse('get_medicines'), {'ordering': 'unknown'}, format='json')
+
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(unknown.status_code, 400)
+        self.assertEqual(unknown.json(), {'error': 'Unknown ordering'})
+
+
+class SuggestMedicinesTest(TestCase):
+    def setUp(self):
+        suggest_index.clear()
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def suggest(self, search):
+        response = self.client.get(reverse('suggest_medicines'), {'search': search})
+        return [suggestion['name'] for suggestion in response.data['suggestions']]
+
+    def test_suggestions_are_served_without_queries(self):
+        Medicine.objects.create(name='Ibuprofen forte', description='', price=10)
+        Medicine.objects.create(name='Ibuklin', description='', price=10)
+        self.suggest('ibu')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('IBU'), ['Ibuklin', 'Ibuprofen forte'])
+            self.assertEqual(self.suggest('fort'), ['Ibuprofen forte'])
+
+    def test_index_follows_changes(self):
+        medicine = Medicine.objects.create(name='Nurofen', description='', price=10)
+        self.suggest('nur')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            medicine.name = 'Nurofen kids'
+            medicine.save()
+            Medicine.objects.create(name='Nurodol', description='', price=10)
+        self.assertEqual(self.suggest('nur'), ['Nurodol', 'Nurofen kids'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            medicine.delete()
+        self.assertEqual(self.suggest('nur'), ['Nurodol'])
+
+
+class CatalogQueryPlanTest(TestCase):
+    """The catalog filters must stay index scans on a large catalog"""
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(0)
+        cls.categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(50)])
+        cls.symptoms = Symptom.objects.bulk_create([Symptom(name=f'Symptom {i}', description='') for i in range(200)])
+        Medicine.objects.bulk_create([
+            Medicine(
+                name=f'Medicine {i}',
+                description='',
+                price=random.randint(100, 100000),
+                category=random.choice(cls.categories),
+                card=None,
+            )
+            for i in range(20000)
+        ], batch_size=5000)
+
+        through = Medicine.symptoms.through
+        through.objects.bulk_create([
+            through(medicine_id=medicine_id, symptom_id=symptom.id)
+            for medicine_id in Medicine.objects.values_list('id', flat=True)
+            for symptom in random.sample(cls.symptoms, 3)
+        ], batch_size=5000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertNoSeqScan(self, data):
+        # The first request renders and stores the cards of the page, the second one is only the catalog query
+        self.client.post(reverse('get_medicines'), data, format='json')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('get_medicines'), data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {context.captured_queries[-1]["sql"]}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_catalog_filters_use_indexes(self):
+        category_id = self.categories[0].id
+        symptom_id = self.symptoms[0].id
+
+        self.assertNoSeqScan({})
+        self.assertNoSeqScan({'ordering': 'price', 'price_from': 50000})
+        self.assertNoSeqScan({'category_id': category_id})
+        self.assertNoSeqScan({'category_id': category_id, 'price_from': 1000, 'price_to': 2000})
+        self.assertNoSeqScan({'symptoms_ids': [symptom_id]})
+        self.assertNoSeqScan({'symptoms_ids': [symptom_id], 'category_id': category_id, 'ordering': 'price'})
+
+
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, size, mode='RGB'):
+        content = io.BytesIO()
+        Image.new(mode, size, 'red').save(content, 'PNG')
+        return SimpleUploadedFile('photo.png', content.getvalue(), content_type='image/png')
+
+    def test_variants_are_generated_by_a_job(self):
+        medicine = Medicine.objects.create(name='Aspirin', description='', price=100, image=self.upload((1200, 600)))
+
+        self.assertTrue(perform(Job.objects.get(name='medicines.images.generate_image_variants')))
+
+        medicine.refresh_from_db()
+        variants = medicine.card['image_variants']
+        self.assertEqual(sorted(variants), ['detail', 'detail_2x', 'list', 'list_2x'])
+        self.assertEqual((variants['list']['webp']['width'], variants['list']['webp']['height']), (320, 160))
+        # Never upscaled
+        self.assertEqual(variants['detail_2x']['jpeg']['width'], 1200)
+        for name in ('list', 'detail'):
+            stored = medicine.image_variants[name]['webp']['name']
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, stored)))
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='user', phone='+77000000000'))
+        response = client.post(reverse('get_medicines'), {}, format='json')
+        self.assertTrue(response.data['medicines'][0]['image_variants']['list']['jpeg']['url'].startswith('http://'))
+
+    def test_replaced_image_gets_new_variants(self):
+        medicine = Medicine.objects.create(
+            name='Aspirin', description='', price=100, image=self.upload((100, 100), 'RGBA')
+        )
+        perform(Job.objects.claim())
+        old = Medicine.objects.get(pk=medicine.pk).image_variants['list']['jpeg']['name']
+
+        medicine.refresh_from_db()
+        medicine.image = self.upload((50, 50))
+        medicine.save()
+        self.assertIsNone(Medicine.objects.get(pk=medicine.pk).card['image_variants'])
+        perform(Job.objects.claim())
+
+        self.assertEqual(Medicine.objects.get(pk=medicine.pk).card['image_variants']['list']['jpeg']['width'], 50)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, old)))
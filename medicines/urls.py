@@ -1,15 +1,16 @@
 from django.urls import path
 
 from medicines.views import (
-    create_medicine, delete_medicine, get_medicines, update_medicine, add_symptoms_to_medicine,
-    remove_symptom_from_medicine, get_symptoms_of_medicine
+    create_medicine, delete_medicine, get_medicines_async, update_medicine, add_symptoms_to_medicine,
+    remove_symptom_from_medicine, get_symptoms_of_medicine, suggest_medicines
 )
 
 urlpatterns = [
     # Medicine
     path('', create_medicine, name='create_medicine'),
     path('/<int:medicine_id>', update_medicine, name='delete_medicine'),
-    path('/list', get_medicines, name='get_medicines'),
+    path('/list', get_medicines_async, name='get_medicines'),
+    path('/suggest', suggest_medicines, name='suggest_medicines'),
     path('/<int:medicine_id>/delete', delete_medicine, name='delete_medicine'),  # TODO: find way to use DELETE method
 
     # Symptom
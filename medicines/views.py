@@ -1,3 +1,4 @@
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.decorators import permission_classes, api_view
@@ -5,10 +6,26 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from categories.models import Category
+from medicines.cards import abuild_cards, build_cards
 from medicines.models import Medicine
+from medicines.search import search_medicines
 from medicines.serializers import MedicineSerializer
+from medicines.suggest import suggest_index
 from symptoms.models import Symptom
 from symptoms.serializers import SymptomSerializer
+from utils.asyncviews import async_api_view
+from utils.pagination import apaginate_keyset, paginate_keyset
+from utils.replicas import replica_reads
+
+SUGGESTIONS_LIMIT = 10
+MAX_SUGGESTIONS_LIMIT = 50
+
+MEDICINE_ORDERINGS = {
+    'relevance': ('-rank', 'id'),
+    'name': ('name', 'id'),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+}
 
 
 @api_view(['POST'])
@@ -43,20 +60,32 @@ def delete_medicine(request, medicine_id):
     return Response({}, status=status.HTTP_200_OK)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def get_medicines(request):
-    data = request.data
+def filter_medicines(data):
+    """Rows of the medicines matching the list filters and their ordering, ValueError for an unknown ordering"""
     search = data.get('search', '')
     symptoms_ids = data.get('symptoms_ids', [])
     category_id = data.get('category_id', None)
     price_from = data.get('price_from', None)
     price_to = data.get('price_to', None)
+    ordering = data.get('ordering', 'relevance' if search else 'name')
+
+    if ordering not in MEDICINE_ORDERINGS:
+        raise ValueError('Unknown ordering')
+
+    medicines = Medicine.objects.all()
 
-    medicines = Medicine.objects.filter(name__icontains=search)
+    if search:
+        medicines = search_medicines(medicines, search)
+    elif ordering == 'relevance':
+        ordering = 'name'
 
     if symptoms_ids:
-        medicines = medicines.filter(symptoms__id__in=symptoms_ids)
+        # EXISTS instead of a join, so no DISTINCT is needed to drop duplicated medicines
+        medicine_symptoms = Medicine.symptoms.through.objects.filter(
+            medicine_id=OuterRef('pk'),
+            symptom_id__in=symptoms_ids
+        )
+        medicines = medicines.filter(Exists(medicine_symptoms))
 
     if category_id:
         medicines = medicines.filter(category_id=category_id)
@@ -67,10 +96,60 @@ def get_medicines(request):
     if price_to:
         medicines = medicines.filter(price__lte=price_to)
 
-    medicines = medicines.distinct()
-    serializer = MedicineSerializer(medicines, context={'request': request}, many=True).data
+    ordering = MEDICINE_ORDERINGS[ordering]
+    fields = {'id', 'card'} | {field.lstrip('-') for field in ordering}
+
+    return medicines.values(*fields), ordering
+
+
+@replica_reads
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def get_medicines(request):
+    try:
+        medicines, ordering = filter_medicines(request.data)
+        rows, next_cursor = paginate_keyset(
+            medicines, ordering, request.data.get('cursor', None), request.data.get('limit', None)
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    cards = build_cards(rows, request)
+
+    return Response({'medicines': cards, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+@replica_reads
+@async_api_view(get_medicines, ['POST'])
+async def get_medicines_async(request):
+    try:
+        medicines, ordering = filter_medicines(request.data)
+        rows, next_cursor = await apaginate_keyset(
+            medicines, ordering, request.data.get('cursor', None), request.data.get('limit', None)
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    cards = await abuild_cards(rows, request)
+
+    return Response({'medicines': cards, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def suggest_medicines(request):
+    """Typeahead by name prefix, served from the in-memory index"""
+    search = request.query_params.get('search', '')
+
+    try:
+        limit = int(request.query_params.get('limit', SUGGESTIONS_LIMIT))
+    except ValueError:
+        return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = max(1, min(limit, MAX_SUGGESTIONS_LIMIT))
+    suggestions = suggest_index.suggest(search, limit)
 
-    return Response({'medicines': serializer}, status=status.HTTP_200_OK)
+    return Response({'suggestions': suggestions}, status=status.HTTP_200_OK)
 
 
 @api_view(['PUT'])
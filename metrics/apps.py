@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class MetricsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'metrics'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from metrics import middleware
+
+        connection_created.connect(middleware.instrument_connection, dispatch_uid='metrics_instrument_connection')
+        middleware.instrument_serializers()
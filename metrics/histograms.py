@@ -0,0 +1,143 @@
+"""
+Per-endpoint request histograms kept in the process memory, exported in the Prometheus text format.
+
+The buckets are log-linear like HdrHistogram's: every doubling of the value is split into the same
+number of buckets, so the relative error of a bucket is the same over the whole range and a few
+dozen counters cover sub-millisecond to multi-second requests. The numbers are those of the
+process serving /metrics and start over when it restarts, requests of other web processes aren't in them.
+"""
+import math
+import threading
+
+
+class Histogram:
+    def __init__(self, lowest, doublings, per_doubling):
+        self.lowest = lowest
+        self.per_doubling = per_doubling
+        self.bounds = [lowest * 2 ** (i / per_doubling) for i in range(doublings * per_doubling + 1)]
+        # The last count is of the values above the highest bound (+Inf)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def bucket(self, value):
+        """Index of the smallest bound the value is at most"""
+        if value <= self.lowest:
+            return 0
+        index = min(math.ceil(math.log2(value / self.lowest) * self.per_doubling), len(self.bounds))
+        # Rounding of log2 near a bound
+        if index > 0 and value <= self.bounds[index - 1]:
+            index -= 1
+        elif index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        return index
+
+    def record(self, value):
+        self.counts[self.bucket(value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the percentile, None if it is above the highest bound"""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * percent / 100) or 1
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[index] if index < len(self.bounds) else None
+
+
+# name: (help, new histogram)
+METRICS = {
+    'http_request_duration_seconds': (
+        'Time from the first to the last middleware', lambda: Histogram(0.00025, 16, 4)
+    ),
+    'http_request_db_queries': (
+        'Database queries made by a request', lambda: Histogram(1, 10, 2)
+    ),
+    'http_request_db_duration_seconds': (
+        'Time a request spent in database queries', lambda: Histogram(0.00025, 16, 4)
+    ),
+    'http_request_serializer_duration_seconds': (
+        'Time a request spent in DRF serializers, including their queries', lambda: Histogram(0.00025, 16, 4)
+    ),
+    'http_response_size_bytes': (
+        'Size of the response body', lambda: Histogram(64, 20, 1)
+    ),
+}
+
+_histograms = {}  # (metric, endpoint): histogram
+_requests = {}  # (endpoint, method, status): count
+_lock = threading.Lock()
+
+
+def observe(endpoint, method, status, values):
+    """Record a request, values are by metric name, missing ones (e.g. the size of a stream) are skipped"""
+    with _lock:
+        _requests[endpoint, method, status] = _requests.get((endpoint, method, status), 0) + 1
+        for metric, value in values.items():
+            if value is None:
+                continue
+            histogram = _histograms.get((metric, endpoint))
+            if histogram is None:
+                histogram = _histograms[metric, endpoint] = METRICS[metric][1]()
+            histogram.record(value)
+
+
+def get_histogram(metric, endpoint):
+    with _lock:
+        return _histograms.get((metric, endpoint))
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _requests.clear()
+
+
+def labels(**values):
+    if not values:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in values.items()
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render():
+    """The requests and histograms in the Prometheus text format"""
+    with _lock:
+        requests = sorted(_requests.items())
+        histograms = {
+            key: (histogram.bounds, list(histogram.counts), histogram.sum, histogram.count)
+            for key, histogram in _histograms.items()
+        }
+
+    lines = [
+        '# HELP http_requests_total Requests by URL name, method and status',
+        '# TYPE http_requests_total counter',
+    ]
+    for (endpoint, method, status), count in requests:
+        lines.append(f'http_requests_total{labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    for metric, (help_text, _) in METRICS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for endpoint in sorted(endpoint for name, endpoint in histograms if name == metric):
+            bounds, counts, total, count = histograms[metric, endpoint]
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{labels(endpoint=endpoint, le=f"{bound:.6g}")} {cumulative}')
+            lines += [
+                f'{metric}_bucket{labels(endpoint=endpoint, le="+Inf")} {count}',
+                f'{metric}_sum{labels(endpoint=endpoint)} {number(total)}',
+                f'{metric}_count{labels(endpoint=endpoint)} {count}',
+            ]
+    return lines
@@ -0,0 +1,132 @@
+"""
+Per-request instrumentation: latency, database queries and their time, serializer time and
+response size, recorded by resolved URL name in metrics.histograms.
+
+With DETECT_N_PLUS_ONE the SQL of every query is also counted by shape (the statement with its
+IN lists collapsed) and shapes run at least N_PLUS_ONE_THRESHOLD times by one request are logged,
+which is what a queryset missing select_related or prefetch_related looks like.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from metrics import histograms
+from utils.middleware import InlineMiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)', re.IGNORECASE)
+
+_state = ContextVar('metrics_state', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper, counts the queries of the current request"""
+    state = _state.get()
+    if state is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state['db_time'] += time.perf_counter() - start
+        state['queries'] += 1
+        if state['shapes'] is not None:
+            state['shapes'][IN_LIST.sub('IN (...)', sql)] += 1
+
+
+def instrument_connection(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_serializers():
+    """Time BaseSerializer.data, where the representation of every DRF serializer is built"""
+    from rest_framework.serializers import BaseSerializer
+
+    data = BaseSerializer.data
+    if getattr(data.fget, 'instrumented', False):
+        return
+
+    def timed_data(self):
+        state = _state.get()
+        # Nested serializers are timed by the outermost one
+        if state is None or state['serializing']:
+            return data.fget(self)
+
+        state['serializing'] = True
+        start = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            state['serializer_time'] += time.perf_counter() - start
+            state['serializing'] = False
+
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+def response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    return len(response.content)
+
+
+def report_repeated_queries(endpoint, shapes):
+    for sql, count in shapes.most_common():
+        if count < settings.N_PLUS_ONE_THRESHOLD:
+            break
+        logger.warning('Possible N+1 in %s: %d queries like %s', endpoint, count, sql)
+
+
+class MetricsMiddleware(InlineMiddlewareMixin, MiddlewareMixin):
+    """Put it first, so the time of the other middlewares counts too"""
+
+    def process_request(self, request):
+        request.metrics_state = {
+            'start': time.perf_counter(),
+            'queries': 0,
+            'db_time': 0.0,
+            'serializer_time': 0.0,
+            'serializing': False,
+            'shapes': Counter() if settings.DETECT_N_PLUS_ONE else None,
+        }
+        request.metrics_token = _state.set(request.metrics_state)
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'metrics_token'):
+            return response
+
+        _state.reset(request.metrics_token)
+        state = request.metrics_state
+        endpoint = endpoint_name(request)
+        histograms.observe(
+            endpoint,
+            request.method if request.method in METHODS else 'other',
+            response.status_code,
+            {
+                'http_request_duration_seconds': time.perf_counter() - state['start'],
+                'http_request_db_queries': state['queries'],
+                'http_request_db_duration_seconds': state['db_time'],
+                'http_request_serializer_duration_seconds': state['serializer_time'],
+                'http_response_size_bytes': response_size(response),
+            }
+        )
+        if state['shapes']:
+            report_repeated_queries(endpoint, state['shapes'])
+        return response
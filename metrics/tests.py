@@ -0,0 +1,88 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from categories.models import Category
+from metrics import histograms
+from metrics.histograms import Histogram
+from metrics.middleware import MetricsMiddleware
+from users.models import User
+
+
+class HistogramTest(SimpleTestCase):
+    def test_values_land_in_the_smallest_bucket_they_fit(self):
+        histogram = Histogram(1, 3, 2)  # 1, 1.41, 2, 2.83, 4, 5.66, 8
+        for value in (0, 1, 1.5, 2, 8, 9, 100):
+            histogram.record(value)
+
+        self.assertEqual(histogram.counts, [2, 0, 2, 0, 0, 0, 1, 2])
+        self.assertEqual(histogram.count, 7)
+        self.assertEqual(histogram.sum, 121.5)
+        self.assertEqual(histogram.percentile(50), 2)
+        self.assertIsNone(histogram.percentile(99))
+
+    def test_relative_error_is_bounded(self):
+        histogram = Histogram(0.00025, 16, 4)
+        for value in (0.0003, 0.0123, 0.5, 7.9):
+            bound = histogram.bounds[histogram.bucket(value)]
+            self.assertGreaterEqual(bound, value)
+            self.assertLess(bound, value * 2 ** 0.25 + 1e-12)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        histograms.reset()
+        self.addCleanup(histograms.reset)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='user', phone='+77000000000'))
+        Category.objects.create(name='Painkillers')
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode().splitlines()
+
+    def test_requests_are_recorded_by_url_name(self):
+        response = self.client.get(reverse('get_categories'))
+        self.client.get(reverse('get_categories'))
+        self.client.get('/no-such-page')
+
+        lines = self.metrics()
+        self.assertIn('http_requests_total{endpoint="get_categories",method="GET",status="200"} 2', lines)
+        self.assertIn('http_requests_total{endpoint="unmatched",method="GET",status="404"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{endpoint="get_categories"} 2', lines)
+        self.assertIn(f'http_response_size_bytes_sum{{endpoint="get_categories"}} {2 * len(response.content)}', lines)
+        self.assertIn('db_pool_checkouts_total', '\n'.join(lines))
+        self.assertIn('token_cache_size', '\n'.join(lines))
+
+        queries = histograms.get_histogram('http_request_db_queries', 'get_categories')
+        # The second response comes from the cache of the view
+        self.assertEqual(queries.count, 2)
+        self.assertGreaterEqual(queries.sum, 1)
+
+    def test_serializer_time_is_recorded(self):
+        self.client.post(reverse('create_category'), {'name': 'Antibiotics'}, format='json')
+
+        self.assertGreater(histograms.get_histogram('http_request_serializer_duration_seconds', 'create_category').sum, 0)
+
+    def test_metrics_need_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+
+    @override_settings(DETECT_N_PLUS_ONE=True, N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_queries_are_logged(self):
+        categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+
+        def view(request):
+            for category in categories:
+                Category.objects.get(pk=category.pk)
+            list(Category.objects.filter(pk__in=[category.pk for category in categories]))
+            return HttpResponse()
+
+        with self.assertLogs('metrics.middleware', 'WARNING') as logs:
+            MetricsMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Possible N+1 in unmatched: 3 queries like', logs.output[0])
+        self.assertEqual(histograms.get_histogram('http_request_db_queries', 'unmatched').sum, 4)
@@ -0,0 +1,60 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from metrics import histograms
+from users.authentication import token_cache
+from utils.dbpool.pool import pool_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# stats() key: (metric, type, help)
+POOL_METRICS = {
+    'size': ('db_pool_size', 'gauge', 'Connections the pool may hold'),
+    'in_use': ('db_pool_connections_in_use', 'gauge', 'Connections lent out'),
+    'idle': ('db_pool_connections_idle', 'gauge', 'Open connections waiting in the pool'),
+    'connects': ('db_pool_connects_total', 'counter', 'Connections opened'),
+    'checkouts': ('db_pool_checkouts_total', 'counter', 'Connections handed out'),
+    'waits': ('db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection'),
+    'wait_seconds': ('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for a free connection'),
+    'max_wait_seconds': ('db_pool_max_wait_seconds', 'gauge', 'Longest wait for a free connection'),
+    'timeouts': ('db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting'),
+    'reclaimed': ('db_pool_reclaimed_total', 'counter', 'Connections reclaimed from exited threads'),
+}
+TOKEN_CACHE_METRICS = {
+    'hits': ('token_cache_hits_total', 'counter', 'Token authentications served from the cache'),
+    'misses': ('token_cache_misses_total', 'counter', 'Token authentications that queried the database'),
+    'size': ('token_cache_size', 'gauge', 'Tokens in the cache'),
+}
+
+
+def authorized(request):
+    """With METRICS_TOKEN set it has to be sent as a Bearer token, without it the metrics are only served in DEBUG"""
+    if not settings.METRICS_TOKEN:
+        return settings.DEBUG
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+def render_stats(definitions, samples):
+    """samples: (labels, stats) pairs"""
+    lines = []
+    for key, (metric, kind, help_text) in definitions.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+        for sample_labels, stats in samples:
+            if key in stats:
+                lines.append(f'{metric}{histograms.labels(**sample_labels)} {histograms.number(stats[key])}')
+    return lines
+
+
+def metrics(request):
+    if not authorized(request):
+        raise Http404
+
+    lines = histograms.render()
+    lines += render_stats(POOL_METRICS, [
+        ({'alias': stats['alias'], 'database': stats['database']}, stats) for stats in pool_stats()
+    ])
+    lines += render_stats(TOKEN_CACHE_METRICS, [({}, token_cache.stats())])
+    return HttpResponse('\n'.join(lines) + '\n', content_type=CONTENT_TYPE)
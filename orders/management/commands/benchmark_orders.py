@@ -0,0 +1,44 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from medicines.models import Medicine
+from orders.models import Order
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Measure latency and query count of order placement for baskets of different sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        # Everything is created inside a transaction which is rolled back at the end
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark', phone='+70000000000')
+            medicines = Medicine.objects.bulk_create([
+                Medicine(name=f'Benchmark medicine {i}', description='', price=100 + i)
+                for i in range(max(options['sizes']))
+            ])
+
+            for size in options['sizes']:
+                items = [{'medicine_id': medicine.id, 'quantity': 1} for medicine in medicines[:size]]
+
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        Order.objects.place(user, 'Benchmark address', items)
+                        timings.append((time.perf_counter() - start) * 1000)
+
+                self.stdout.write(
+                    f'{size:>4} lines: p50={statistics.median(timings):.2f}ms '
+                    f'max={max(timings):.2f}ms queries={len(context.captured_queries)}'
+                )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicines', '0004_catalog_indexes'),
+        ('orders', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True),
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('unit_price', models.DecimalField(decimal_places=2, help_text='Price of medicine when the order was placed', max_digits=10)),
+                ('medicine', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='medicines.medicine')),
+            ],
+            options={
+                'verbose_name': 'Order Item',
+                'verbose_name_plural': 'Order Items',
+            },
+        ),
+        # Links to cart rows were never created, there is nothing to carry over
+        migrations.RemoveField(
+            model_name='order',
+            name='order_items',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='order_items',
+            field=models.ManyToManyField(to='orders.orderitem'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+MOVE_ORDER_ITEMS = '''
+UPDATE orders_orderitem i SET order_id = t.order_id
+FROM orders_order_order_items t WHERE t.orderitem_id = i.id;
+
+DELETE FROM orders_orderitem WHERE order_id IS NULL;
+
+UPDATE orders_orderitem SET line_total = quantity * unit_price;
+
+UPDATE orders_order o SET total = COALESCE(
+    (SELECT SUM(i.line_total) FROM orders_orderitem i WHERE i.order_id = o.id), 0
+);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_order_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Sum of line totals of the order items', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.order'),
+        ),
+        migrations.RunSQL(MOVE_ORDER_ITEMS, migrations.RunSQL.noop),
+        migrations.RemoveField(
+            model_name='order',
+            name='order_items',
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.order'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order'], include=('medicine', 'quantity', 'unit_price', 'line_total'), name='order_item_order_covering_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+# Lines of pending orders placed with reservations, whose medicine is tracked, hold reserved units
+MARK_RESERVED_LINES = '''
+UPDATE orders_orderitem i SET stock_reserved = true
+FROM orders_order o
+WHERE o.id = i.order_id AND o.stock_reserved AND o.status = 'PENDING'
+    AND EXISTS (SELECT 1 FROM inventory_stock s WHERE s.medicine_id = i.medicine_id);
+'''
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('orders', '0006_order_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='stock_reserved',
+            field=models.BooleanField(default=False, help_text='Units were reserved when the order was placed, they are released when the order leaves PENDING'),
+        ),
+        migrations.RunSQL(MARK_RESERVED_LINES, migrations.RunSQL.noop),
+        migrations.RemoveField(
+            model_name='order',
+            name='stock_reserved',
+        ),
+    ]
@@ -1,10 +1,182 @@
-from datetime import datetime
-
-from django.db import models
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from cart.models import Cart
+from inventory.models import Stock
+from medicines.models import Medicine
 from users.models import User
+from utils.replicas import use_primary
+
+
+class OrderItem(models.Model):
+    """Append-only line of an order, prices are snapshotted when the order is placed"""
+    order = models.ForeignKey(
+        'Order',
+        on_delete=models.CASCADE,
+        related_name='items',
+        db_index=False  # covered by order_item_order_covering_idx
+    )
+    medicine = models.ForeignKey(
+        Medicine,
+        on_delete=models.SET_NULL,
+        null=True
+    )
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        help_text='Price of medicine when the order was placed'
+    )
+    line_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2
+    )
+    stock_reserved = models.BooleanField(
+        default=False,
+        help_text='Units were reserved when the order was placed, they are released when the order leaves PENDING'
+    )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order items are append-only')
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.medicine_id} - {self.quantity}'
+
+    class Meta:
+        verbose_name = 'Order Item'
+        verbose_name_plural = 'Order Items'
+        indexes = [
+            # Items of an order are read with an index-only scan
+            models.Index(
+                fields=['order'],
+                include=['medicine', 'quantity', 'unit_price', 'line_total'],
+                name='order_item_order_covering_idx'
+            ),
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+    def transition(self, status, **fields):
+        """
+        Move the orders to status with one conditional UPDATE.
+        Orders whose current status does not allow the transition are left as they are,
+        so racing clients cannot both win. Returns ids of the orders moved.
+        Stock reserved by the moved orders is released or shipped in the same statement.
+        """
+        self._for_write = True
+        try:
+            orders_sql, orders_params = self.values('pk').query.sql_with_params()
+        except EmptyResultSet:
+            # e.g. id__in=[]
+            return []
+
+        connection = connections[self.db]
+        table = self.model._meta.db_table
+        fields['status'] = status
+
+        assignments = []
+        params = []
+        for name, value in fields.items():
+            field = self.model._meta.get_field(name)
+            assignments.append(f'{field.column} = %s')
+            params.append(field.get_db_prep_save(value, connection))
+
+        allowed = Order.TRANSITIONS[status]
+        # Cancellation puts the units back on the shelf, delivery only drops the reservation
+        restock = 1 if status in Order.RESTOCKING_STATUSES else 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'''
+                WITH moved AS (
+                    UPDATE {table} SET {', '.join(assignments)}
+                    WHERE id IN ({orders_sql}) AND status IN ({', '.join(['%s'] * len(allowed))})
+                    RETURNING id
+                ), lines AS (
+                    SELECT i.medicine_id, SUM(i.quantity) AS quantity
+                    FROM {OrderItem._meta.db_table} i JOIN moved m ON m.id = i.order_id
+                    WHERE i.stock_reserved AND i.medicine_id IS NOT NULL
+                    GROUP BY i.medicine_id
+                ), locked AS MATERIALIZED (
+                    -- In medicine order like Stock.objects.reserve(), the join order of the update is up to the planner
+                    SELECT s.medicine_id FROM {Stock._meta.db_table} s JOIN lines l ON l.medicine_id = s.medicine_id
+                    ORDER BY s.medicine_id
+                    FOR UPDATE OF s
+                ), stock AS (
+                    UPDATE {Stock._meta.db_table} s
+                    SET reserved = s.reserved - l.quantity, available = s.available + l.quantity * %s
+                    FROM lines l JOIN locked k ON k.medicine_id = l.medicine_id
+                    WHERE s.medicine_id = l.medicine_id
+                )
+                SELECT id FROM moved
+            ''', [*params, *orders_params, *allowed, restock])
+            return [row[0] for row in cursor.fetchall()]
+
+    def deliver(self):
+        return self.transition(Order.Status.DELIVERED, delivered_at=timezone.now())
+
+    def cancel_by_user(self, reason):
+        return self.transition(Order.Status.CANCELED_BY_USER, canceled_at=timezone.now(), cancel_reason=reason)
+
+    def cancel_by_admin(self, reason):
+        return self.transition(Order.Status.CANCELED_BY_ADMIN, canceled_at=timezone.now(), cancel_reason=reason)
+
+
+class OrderManager(models.Manager.from_queryset(OrderQuerySet)):
+    def place(self, user, address, items):
+        """
+        Create an order from [{medicine_id, quantity}] with a constant number of queries:
+        one to resolve all medicines, then the order, its items and the stock reservation in one transaction.
+        Returns (order, ids of medicines which were not found), order is None if nothing was found.
+        Raises OutOfStock if some medicine is short, nothing is created then.
+        """
+        quantities = {}
+        for item in items:
+            medicine_id = int(item['medicine_id'])
+            quantity = int(item['quantity'])
+            if quantity <= 0:
+                raise ValueError('Quantity must be positive')
+            quantities[medicine_id] = quantities.get(medicine_id, 0) + quantity
+
+        # Prices of the order, a replica may still have the old ones
+        with use_primary():
+            medicines = Medicine.objects.only('id', 'price').in_bulk(list(quantities))
+        not_found_medicines = [medicine_id for medicine_id in quantities if medicine_id not in medicines]
+        if not medicines:
+            return None, not_found_medicines
+
+        order_items = [
+            OrderItem(
+                medicine=medicine,
+                quantity=quantities[medicine_id],
+                unit_price=medicine.price,
+                line_total=medicine.price * quantities[medicine_id]
+            )
+            for medicine_id, medicine in medicines.items()
+        ]
+
+        with transaction.atomic(using=self.db):
+            order = self.create(
+                user=user,
+                address=address,
+                total=sum(order_item.line_total for order_item in order_items)
+            )
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
+            # At the end of the transaction, so hot stock rows stay locked for the shortest time
+            reserved = Stock.objects.db_manager(self.db).reserve(
+                {medicine_id: quantities[medicine_id] for medicine_id in medicines}
+            )
+            # Only these lines release stock later, the other medicines weren't tracked
+            if reserved:
+                OrderItem.objects.using(self.db).filter(order=order, medicine_id__in=reserved).update(
+                    stock_reserved=True
+                )
+
+        return order, not_found_medicines
 
 
 class Order(models.Model):
@@ -14,7 +186,19 @@ class Order(models.Model):
         CANCELED_BY_USER = "CANCELED_BY_USER", _("CANCELED_BY_USER")
         CANCELED_BY_ADMIN = "CANCELED_BY_ADMIN", _("CANCELED_BY_ADMIN")
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Target status: statuses it can be reached from
+    TRANSITIONS = {
+        Status.DELIVERED: [Status.PENDING],
+        Status.CANCELED_BY_USER: [Status.PENDING],
+        Status.CANCELED_BY_ADMIN: [Status.PENDING],
+    }
+    RESTOCKING_STATUSES = [Status.CANCELED_BY_USER, Status.CANCELED_BY_ADMIN]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False  # covered by order_user_history_idx
+    )
     address = models.TextField(
         help_text='Address of user to deliver medicine'
     )
@@ -23,29 +207,36 @@ class Order(models.Model):
         choices=Status.choices,
         default=Status.PENDING
     )
-    order_items = models.ManyToManyField(Cart)
-
-    created_at = models.DateTimeField(null=True, blank=True)
+    total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        help_text='Sum of line totals of the order items'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
     delivered_at = models.DateTimeField(null=True, blank=True)
     canceled_at = models.DateTimeField(null=True, blank=True)
     cancel_reason = models.TextField(null=True, blank=True)
 
+    objects = OrderManager()
+
+    def _transition(self, status, **fields):
+        """Returns whether the transition won, the instance is updated only if it did"""
+        won = bool(Order.objects.filter(pk=self.pk).transition(status, **fields))
+        if won:
+            self.status = status
+            for field, value in fields.items():
+                setattr(self, field, value)
+        return won
+
     def cancel_by_user(self, reason):
-        self.status = self.Status.CANCELED_BY_USER
-        self.canceled_at = datetime.now()
-        self.cancel_reason = reason
-        self.save()
+        return self._transition(self.Status.CANCELED_BY_USER, canceled_at=timezone.now(), cancel_reason=reason)
 
     def cancel_by_admin(self, reason):
-        self.status = self.Status.CANCELED_BY_ADMIN
-        self.canceled_at = datetime.now()
-        self.cancel_reason = reason
-        self.save()
+        return self._transition(self.Status.CANCELED_BY_ADMIN, canceled_at=timezone.now(), cancel_reason=reason)
 
     def deliver(self):
-        self.status = self.Status.DELIVERED
-        self.delivered_at = datetime.now()
-        self.save()
+        return self._transition(self.Status.DELIVERED, delivered_at=timezone.now())
 
     def __str__(self):
         return f'{self.user.username} - {self.created_at}'
@@ -53,3 +244,12 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_history_idx'),
+            # Pending orders are a small share of the table, the dispatcher queue only indexes them
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(status='PENDING'),
+                name='order_pending_queue_idx'
+            ),
+        ]
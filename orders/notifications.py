@@ -0,0 +1,25 @@
+from jobs.queue import job
+from orders.models import Order
+from utils.notifications import dispatcher
+
+STATUS_MESSAGES = {
+    Order.Status.DELIVERED: ('Order delivered', 'Your order has been delivered'),
+    Order.Status.CANCELED_BY_ADMIN: ('Order canceled', 'Your order has been canceled by the pharmacy'),
+}
+
+
+def notify_status_changed(order_ids, status):
+    """Tell the owners of the orders about the new status, queued until the transaction commits"""
+    if order_ids and status in STATUS_MESSAGES:
+        send_status_changed.enqueue(order_ids=list(order_ids), status=status)
+
+
+@job(max_attempts=3)
+def send_status_changed(order_ids, status):
+    title, body = STATUS_MESSAGES[status]
+    data = {'type': 'order_status', 'status': status}
+    if len(order_ids) == 1:
+        data['order_id'] = order_ids[0]
+
+    user_ids = Order.objects.filter(id__in=order_ids).values_list('user_id', flat=True).distinct()
+    dispatcher.send(title, body, data=data, user_ids=user_ids)
@@ -1,15 +1,21 @@
 from rest_framework import serializers
 
-from medicines.serializers import MedicineSerializer
-from orders.models import Order, CartItem
+from orders.models import Order, OrderItem
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    order_items = serializers.SerializerMethodField('get_order_items', read_only=True)
+class OrderItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderItem
+        fields = [
+            'medicine',
+            'quantity',
+            'unit_price',
+            'line_total',
+        ]
 
-    @staticmethod
-    def get_order_items(obj):
-        return OrderItemSerializer(obj.order_items, many=True).data
+
+class OrderSerializer(serializers.ModelSerializer):
+    items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
         model = Order
@@ -17,23 +23,11 @@ class OrderSerializer(serializers.ModelSerializer):
             'id',
             'user',
             'address',
-            'order_items',
+            'status',
+            'total',
+            'items',
             'created_at',
-            'updated_at',
+            'delivered_at',
+            'canceled_at',
+            'cancel_reason',
         ]
-
-
-class OrderItemSerializer(serializers.ModelSerializer):
-    medicine = serializers.SerializerMethodField('get_medicine', read_only=True)
-
-    @staticmethod
-    def get_medicine(obj):
-        return MedicineSerializer(obj.medicine).data
-
-    class Meta:
-        model = CartItem
-        fields = [
-            'id',
-            'medicine',
-            'quantity',
-        ]
\ No newline at end of file
@@ -1,3 +1,173 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from inventory.models import Stock
+from medicines.models import Medicine
+from orders.models import Order
+from users.models import User
+
+
+class CreateOrderTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.medicines = [
+            Medicine.objects.create(name=f'Medicine {i}', description='', price=100 + i)
+            for i in range(20)
+        ]
+        Stock.objects.restock({medicine.id: 100 for medicine in self.medicines})
+
+    def place(self, lines):
+        items = [{'medicine_id': medicine.id, 'quantity': 2} for medicine in self.medicines[:lines]]
+        with CaptureQueriesContext(connection) as context:
+            Order.objects.place(self.user, 'Address', items)
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        self.assertEqual(self.place(1), self.place(20))
+
+    def test_create_order(self):
+        response = self.client.post(reverse('create_order'), {
+            'address': 'Address',
+            'order_items': [
+                {'medicine_id': self.medicines[0].id, 'quantity': 2},
+                {'medicine_id': 0, 'quantity': 1},
+            ],
+        }, format='json')
+        self.assertEqual(response.data['not_found_medicines'], [0])
+
+        self.medicines[0].price = 1000
+        self.medicines[0].save()
+
+        order = Order.objects.get(id=response.data['order_id'])
+        order_item = order.items.get()
+        self.assertEqual(order.total, 200)
+        self.assertEqual(order_item.quantity, 2)
+        self.assertEqual(order_item.unit_price, 100)
+        self.assertEqual(order_item.line_total, 200)
+
+        order_item.quantity = 3
+        with self.assertRaises(ValueError):
+            order_item.save()
+
+
+class OrderFeedTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.staff = User.objects.create_user(username='staff', phone='+77000000001', is_staff=True)
+        self.client = APIClient()
+        medicine = Medicine.objects.create(name='Aspirin', description='', price=100)
+        Stock.objects.restock({medicine.id: 100})
+        self.orders = [
+            Order.objects.place(self.user, f'Address {i}', [{'medicine_id': medicine.id, 'quantity': 1}])[0]
+            for i in range(5)
+        ]
+        Order.objects.filter(id=self.orders[1].id).update(status=Order.Status.DELIVERED)
+
+    def walk(self, url_name, user):
+        self.client.force_authenticate(user)
+        ids = []
+        cursor = None
+        while True:
+            params = {'limit': 2, 'cursor': cursor} if cursor else {'limit': 2}
+            response = self.client.get(reverse(url_name), params)
+            ids += [order['id'] for order in response.data['orders']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_history_is_newest_first(self):
+        ids = self.walk('get_orders', self.user)
+
+        self.assertEqual(ids, [order.id for order in reversed(self.orders)])
+
+    def test_pending_feed_is_oldest_first(self):
+        ids = self.walk('get_pending_orders', self.staff)
+
+        self.assertEqual(ids, [order.id for order in self.orders if order.id != self.orders[1].id])
+
+    def test_pending_feed_is_staff_only(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(reverse('get_pending_orders'))
+
+        self.assertEqual(response.status_code, 403)
+
+
+class OrderStatusTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.staff = User.objects.create_user(username='staff', phone='+77000000001', is_staff=True)
+        self.client = APIClient()
+        medicine = Medicine.objects.create(name='Aspirin', description='', price=100)
+        Stock.objects.restock({medicine.id: 100})
+        self.orders = [
+            Order.objects.place(self.user, f'Address {i}', [{'medicine_id': medicine.id, 'quantity': 1}])[0]
+            for i in range(3)
+        ]
+
+    def test_only_first_transition_wins(self):
+        first = Order.objects.get(id=self.orders[0].id)
+        second = Order.objects.get(id=self.orders[0].id)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(first.deliver())
+        self.assertFalse(second.cancel_by_admin('Out of stock'))
+
+        self.assertEqual(second.status, Order.Status.PENDING)
+        order = Order.objects.get(id=self.orders[0].id)
+        self.assertEqual(order.status, Order.Status.DELIVERED)
+        self.assertEqual(order.delivered_at, first.delivered_at)
+        self.assertIsNone(order.canceled_at)
+
+    def test_update_order_status(self):
+        self.client.force_authenticate(self.staff)
+        url = reverse('update_order_status', args=[self.orders[0].id])
+
+        response = self.client.post(url, {'status': 'CANCELED_BY_ADMIN', 'reason': 'Out of stock'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(url, {'status': 'DELIVERED'}, format='json')
+        self.assertEqual(response.status_code, 409)
+
+        response = self.client.post(url, {'status': 'PENDING'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cancel_order(self):
+        other = User.objects.create_user(username='other', phone='+77000000002')
+        self.client.force_authenticate(other)
+        response = self.client.post(reverse('cancel_order', args=[self.orders[0].id]), format='json')
+        self.assertEqual(response.status_code, 404)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('cancel_order', args=[self.orders[0].id]), {'reason': 'Changed my mind'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get(id=self.orders[0].id).cancel_reason, 'Changed my mind')
+
+    def test_deliver_orders_in_one_statement(self):
+        self.orders[0].cancel_by_user('Changed my mind')
+        self.client.force_authenticate(self.staff)
+        order_ids = [order.id for order in self.orders]
+
+        response = self.client.post(reverse('deliver_orders'), {'order_ids': order_ids[:2]}, format='json')
+        self.assertEqual((response.data['delivered'], response.data['ids']), (1, [order_ids[1]]))
+
+        with self.assertNumQueries(1):
+            Order.objects.filter(id__in=order_ids).deliver()
+        response = self.client.post(reverse('deliver_orders'), {'order_ids': order_ids}, format='json')
+
+        self.assertEqual((response.data['delivered'], response.data['ids']), (0, []))
+        self.assertEqual(Order.objects.filter(status=Order.Status.DELIVERED).count(), 2)
+
+    def test_deliver_no_orders(self):
+        self.client.force_authenticate(self.staff)
+
+        response = self.client.post(reverse('deliver_orders'), {'order_ids': []}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['delivered'], response.data['ids']), (0, []))
@@ -1,11 +1,16 @@
 from django.urls import path
 
-from orders.views import create_order
+from orders.views import (
+    cancel_order, create_order, deliver_orders, get_order, get_orders, get_pending_orders, update_order_status
+)
 
 urlpatterns = [
     path('', create_order, name='create_order'),
     # path('/<int:order_id>', delete_order, name='delete_order'),
-    # path('/<int:order_id>', get_order, name='get_order'),
-    # path('/list', get_orders, name='get_orders'),
-    # path('/<int:order_id>/status', update_order_status, name='update_order_status'),
+    path('/<int:order_id>', get_order, name='get_order'),
+    path('/list', get_orders, name='get_orders'),
+    path('/pending', get_pending_orders, name='get_pending_orders'),
+    path('/<int:order_id>/status', update_order_status, name='update_order_status'),
+    path('/<int:order_id>/cancel', cancel_order, name='cancel_order'),
+    path('/deliver', deliver_orders, name='deliver_orders'),
 ]
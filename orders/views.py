@@ -4,8 +4,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from medicines.models import Medicine
-from orders.models import Cart, Order
+from inventory.models import OutOfStock
+from orders.models import Order
+from orders.notifications import notify_status_changed
+from orders.serializers import OrderSerializer
+from users.permissions.staff_permission import IsStaff
+from utils.pagination import paginate_keyset
 
 
 @api_view(['POST'])
@@ -14,29 +18,26 @@ def create_order(request):
     order_items = request.data['order_items']  # {medicine_id, quantity}
     address = request.data['address']
 
-    order_items_to_create = []
-    not_found_medicines = []
+    try:
+        order, not_found_medicines = Order.objects.place(request.user, address, order_items)
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': 'Every order item needs medicine_id and quantity'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except OutOfStock as e:
+        return Response({
+            'error': 'Some medicines are out of stock',
+            'out_of_stock_medicines': e.medicine_ids,
+        }, status=status.HTTP_409_CONFLICT)
 
-    for order_item in order_items:
-        medicine = Medicine.objects.get(id=order_item['medicine_id'])
-        if not medicine:
-            not_found_medicines.append(order_item['medicine_id'])
-            continue
-
-        order_items_to_create.append(
-            Cart(
-                medicine=medicine,
-                quantity=order_item['quantity']
-            )
-        )
-
-    Cart.objects.bulk_create(order_items_to_create)
-    Order.objects.create(
-        user=request.user,
-        address=address
-    )
+    if order is None:
+        return Response({
+            'error': 'None of the medicines were found',
+            'not_found_medicines': not_found_medicines,
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({
+        'order_id': order.id,
+        'total': str(order.total),
         'not_found_medicines': not_found_medicines,
     }, status=status.HTTP_200_OK)
 
@@ -53,6 +54,100 @@ def delete_order(request, order_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    orders = Order.objects.prefetch_related('items')
+    if not request.user.is_staff:
+        orders = orders.filter(user=request.user)
+
+    order = get_object_or_404(orders, id=order_id)
+    serializer = OrderSerializer(order).data
+
+    return Response(serializer, status=status.HTTP_200_OK)
+
+
+def paginated_orders(request, orders, ordering):
+    try:
+        orders, next_cursor = paginate_keyset(
+            orders.prefetch_related('items'),
+            ordering,
+            request.query_params.get('cursor'),
+            request.query_params.get('limit')
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = OrderSerializer(orders, many=True).data
+
+    return Response({'orders': serializer, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_orders(request):
+    """Order history of the user, newest first"""
+    orders = Order.objects.filter(user=request.user)
+
+    return paginated_orders(request, orders, ('-created_at', '-id'))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsStaff])
+def get_pending_orders(request):
+    """Dispatcher queue, oldest pending order first"""
+    orders = Order.objects.filter(status=Order.Status.PENDING)
+
+    return paginated_orders(request, orders, ('created_at', 'id'))
+
+
+def transition_conflict(orders, order_id):
+    if not orders.filter(id=order_id).exists():
+        return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({'error': 'Order status has already been changed'}, status=status.HTTP_409_CONFLICT)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_order(request, order_id):
+    orders = Order.objects.filter(user=request.user)
+
+    if not orders.filter(id=order_id).cancel_by_user(request.data.get('reason')):
+        return transition_conflict(orders, order_id)
+
+    return Response({}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsStaff])
+def update_order_status(request, order_id):
+    new_status = request.data.get('status')
+    orders = Order.objects.filter(id=order_id)
+
+    if new_status == Order.Status.DELIVERED:
+        updated = orders.deliver()
+    elif new_status == Order.Status.CANCELED_BY_ADMIN:
+        updated = orders.cancel_by_admin(request.data.get('reason'))
+    else:
+        return Response({'error': 'Status must be DELIVERED or CANCELED_BY_ADMIN'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    if not updated:
+        return transition_conflict(Order.objects.all(), order_id)
+
+    notify_status_changed(updated, new_status)
 
     return Response({}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsStaff])
+def deliver_orders(request):
+    """Mark many pending orders delivered in one statement"""
+    try:
+        order_ids = [int(order_id) for order_id in request.data['order_ids']]
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': 'order_ids must be a list of ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+    delivered = Order.objects.filter(id__in=order_ids).deliver()
+    notify_status_changed(delivered, Order.Status.DELIVERED)
+
+    return Response({'delivered': len(delivered), 'ids': delivered}, status=status.HTTP_200_OK)
@@ -1,12 +1,16 @@
+import logging
 import os
 import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 django.setup()
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter
 
+logging.getLogger(__name__).info('DEBUG: %s, ALLOWED_HOSTS: %s', settings.DEBUG, settings.ALLOWED_HOSTS)
+
 application = ProtocolTypeRouter({
     'http': get_asgi_application(),
 })
@@ -14,9 +14,6 @@ DEBUG = bool(int(os.environ.get('DJANGO_DEBUG', 1)))
 
 ALLOWED_HOSTS = ['*'] if DEBUG else os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
 
-print('DEBUG: ', DEBUG)
-print('ALLOWED_HOSTS: ', ALLOWED_HOSTS)
-
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -25,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # 'nested_admin',
     'channels',
     # CORS
@@ -40,7 +38,11 @@ INSTALLED_APPS = [
     'categories',
     'cart',
     'orders',
+    'inventory',
+    'jobs',
+    'blobs',
     'properties',
+    'metrics',
 ]
 WSGI_APPLICATION = 'project.wsgi.application'
 ASGI_APPLICATION = 'project.asgi.application'
@@ -52,9 +54,16 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Hot read views are served by their async versions, see utils.asyncviews
+ASYNC_VIEWS = bool(int(os.environ.get('ASYNC_VIEWS', 1)))
+
+# Token -> user cache of users.authentication
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ]
 }
@@ -79,19 +88,29 @@ FCM_DJANGO_SETTINGS = {
     "UPDATE_ON_DUPLICATE_REG_ID": False,
 }
 
+# Stock middlewares except CSRF run on the event loop under daphne, see utils.middleware
 MIDDLEWARE = [
+    'metrics.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
+    'utils.replicas.ReplicaMiddleware',
+    'utils.middleware.SecurityMiddleware',
+    'utils.middleware.SessionMiddleware',
+    'utils.middleware.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.middleware.AuthenticationMiddleware',
+    'utils.middleware.MessageMiddleware',
+    'utils.middleware.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'project.urls'
 
+# Per-endpoint histograms served on /metrics, see metrics.middleware. The endpoint needs
+# "Authorization: Bearer <METRICS_TOKEN>", without a token it is only served in DEBUG.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Log SQL run at least N_PLUS_ONE_THRESHOLD times by one request
+DETECT_N_PLUS_ONE = bool(int(os.environ.get('DETECT_N_PLUS_ONE', 0)))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -108,18 +127,55 @@ TEMPLATES = [
     },
 ]
 
+# Daphne runs every request in a new thread, so per-thread persistent connections aren't reused there.
+# Connections come from a process-wide pool instead (utils.dbpool), DB_POOL_SIZE=0 turns it off.
+# The pool bounds the connections of the process, requests wait for a free one for DB_POOL_TIMEOUT.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', os.environ.get('ASGI_THREADS', 10)))
+# Behind pgbouncer in transaction mode: no server-side cursors, pgbouncer does the pooling.
+# The database time zone should then be UTC, so Django doesn't need a session-level SET TIME ZONE.
+DB_PGBOUNCER = bool(int(os.environ.get('DB_PGBOUNCER', 0)))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'utils.dbpool' if DB_POOL_SIZE else 'django.db.backends.postgresql_psycopg2',
         'NAME': os.environ.get('DB_NAME', 'easypharm'),
         'USER': os.environ.get('DB_USER', 'easypharm'),
         'PASSWORD': os.environ.get('DB_PASS', 'easypharm'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': int(os.environ.get('DB_PORT', 5432)),
-        'ATOMIC_REQUESTS': False
+        'ATOMIC_REQUESTS': False,
+        # With the pool a connection goes back to it when Django would close it. Without it, a persistent
+        # connection only helps long-lived threads (runjobs), under daphne it is left open by the exited thread
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': bool(int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+        },
     }
 }
 
+# Read replicas as comma-separated host[:port][/name], e.g. DB_REPLICAS=replica-1,replica-2:5433.
+# Catalog reads of requests go to them, see utils.replicas. Locally a second database of the same
+# server works too (DB_REPLICAS=localhost/easypharm_copy), as long as it holds the same rows.
+for number, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    replica_host, _, replica_name = replica.strip().partition('/')
+    replica_host, _, replica_port = replica_host.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': int(replica_port or DATABASES['default']['PORT']),
+        'NAME': replica_name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias.startswith('replica_')]
+REPLICA_APPS = {'medicines', 'categories', 'symptoms', 'properties'}
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+DATABASE_ROUTERS = ['utils.replicas.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -166,4 +222,26 @@ AUTH_USER_MODEL = 'users.User'
 CORS_ORIGIN_ALLOW_ALL = True
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_ROOT = os.environ.get('DJANGO_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+# Processes for image and video processing, see utils.media
+MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 2))
+
+# Our loggers print to the console, Django's keep their defaults
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        name: {'handlers': ['console'], 'level': os.environ.get('LOG_LEVEL', 'INFO'), 'propagate': False}
+        for name in (
+            'project', 'utils', 'users', 'medicines', 'symptoms', 'categories', 'cart', 'orders', 'inventory',
+            'jobs', 'blobs', 'properties', 'metrics',
+        )
+    },
+}
@@ -3,6 +3,8 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from metrics.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth', include('users.urls')),
@@ -11,4 +13,7 @@ urlpatterns = [
     path('symptoms', include('symptoms.urls')),
     path('categories', include('categories.urls')),
     path('cart', include('cart.urls')),
+    path('orders', include('orders.urls')),
+    path('inventory', include('inventory.urls')),
+    path('metrics', metrics, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
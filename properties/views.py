@@ -4,10 +4,12 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from properties.models import Timezone, Countrycode
 from properties.serializers import TimezoneSerializer, CountrycodeSerializer
+from utils.cache import cached_json
 
 
 @api_view(['GET'])
 @permission_classes((AllowAny,))
+@cached_json(Timezone)
 def timezone_list(request):
     if request.method == 'GET':
         timezones = Timezone.objects.all().order_by('id')
@@ -20,6 +22,7 @@ def timezone_list(request):
 
 @api_view(['GET'])
 @permission_classes((AllowAny,))
+@cached_json(Countrycode)
 def countrycodes_list(request):
     if request.method == 'GET':
         countrycodes = Countrycode.objects.all().order_by('id')
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from symptoms.models import Symptom
 from symptoms.serializers import SymptomSerializer
 from users.permissions.staff_permission import IsStaff
+from utils.cache import cached_json
 
 
 @api_view(['POST'])
@@ -54,6 +55,7 @@ def update_symptom(request, symptom_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])  # TODO: Add IsStaff permission
+@cached_json(Symptom)
 def get_symptoms(request):
     symptoms = Symptom.objects.all()
 
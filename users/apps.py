@@ -5,3 +5,7 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'Пользователи и их данные'
+
+    def ready(self):
+        # Connects the token cache invalidation signals
+        import users.authentication  # noqa: F401
@@ -0,0 +1,157 @@
+"""
+Token authentication with an in-process cache of token -> (user, token).
+
+A cache hit costs no queries. Entries expire after TOKEN_CACHE_TTL seconds and are dropped
+by signals when the token is deleted or rotated and when the user is saved or deleted.
+QuerySet.update() sends no signals, so changes made with it show up only after the TTL.
+The cache lives in the memory of each process and the signals reach only the process which made
+the change: a token revoked or a user deactivated by `manage.py runjobs`, the shell or another
+command stays valid in daphne until its entry expires, i.e. for up to TOKEN_CACHE_TTL seconds.
+TOKEN_CACHE_TTL=0 turns the cache off where that is too long.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+
+class TokenCache:
+    """Bounded LRU with a TTL, keyed by token key"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped by every invalidation, a user read from the database before it is not cached
+        self.generation = 0
+        self._entries = OrderedDict()  # key: (expires at, user, token)
+        self._keys_of_users = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, user, token = entry
+
+        # Every request gets its own copy, views may change request.user
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        user._state.fields_cache['auth_token'] = token
+        return user, token
+
+    def set(self, key, user, token, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, copy.copy(user), copy.copy(token))
+            self._keys_of_users.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._remove(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self.generation += 1
+            for key in list(self._keys_of_users.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.hits = self.misses = 0
+            self._entries.clear()
+            self._keys_of_users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._keys_of_users.get(entry[1].pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_of_users[entry[1].pk]
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        generation = token_cache.generation
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token, generation)
+        return user, token
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views with the async ORM.
+        None for anything but a valid token, the sync path answers those with DRF's errors.
+        """
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            return None
+
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        generation = token_cache.generation
+        model = self.get_model()
+        try:
+            token = await model.objects.select_related('user').aget(key=key)
+        except model.DoesNotExist:
+            return None
+        if not token.user.is_active:
+            return None
+
+        token_cache.set(key, token.user, token, generation)
+        return token.user, token
+
+
+def invalidate_token(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.user_id)
+
+
+def invalidate_user(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+post_save.connect(invalidate_token, sender=Token, dispatch_uid='token_cache_token_saved')
+post_delete.connect(invalidate_token, sender=Token, dispatch_uid='token_cache_token_deleted')
+post_save.connect(invalidate_user, sender=User, dispatch_uid='token_cache_user_saved')
+post_delete.connect(invalidate_user, sender=User, dispatch_uid='token_cache_user_deleted')
@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token
 
 from users.models import User
 
@@ -9,8 +8,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_token(obj):
-        token = Token.objects.get(user=obj)
-        return token.key
+        # Users authenticated by a token already have it cached, others load it here
+        return obj.auth_token.key
 
     class Meta:
         model = User
@@ -1,3 +1,72 @@
+from unittest import mock
+
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from users.authentication import TokenCache, token_cache
+from users.models import User
+
+
+class TokenCacheTest(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_costs_no_queries(self):
+        self.assertEqual(self.client.get(reverse('me_view')).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('me_view'))
+
+        self.assertEqual(response.data['token'], self.token.key)
+        self.assertEqual(token_cache.stats(), {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_user_changes_invalidate_the_entry(self):
+        self.client.get(reverse('me_view'))
+
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(token_cache.stats()['size'], 0)
+        self.assertEqual(self.client.get(reverse('me_view')).data['username'], 'renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('me_view')).status_code, 401)
+
+    def test_logout_keeps_the_token_of_other_devices(self):
+        self.client.get(reverse('me_view'))
+
+        response = self.client.post(reverse('logout'), {'device_id': 'unknown'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_cache.stats()['size'], 0)
+        self.assertTrue(Token.objects.filter(key=self.token.key).exists())
+        self.assertEqual(self.client.get(reverse('me_view')).status_code, 200)
+
+    def test_lru_eviction_and_ttl(self):
+        cache = TokenCache(maxsize=2, ttl=60)
+        users = [User(pk=i, username=f'user-{i}') for i in range(3)]
+        for user in users:
+            cache.set(user.username, user, Token(key=user.username, user=user), cache.generation)
+
+        self.assertIsNone(cache.get('user-0'))
+        self.assertEqual(cache.get('user-1')[0].pk, 1)
+
+        with mock.patch('users.authentication.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(cache.get('user-2'))
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_entry_read_before_an_invalidation_is_not_cached(self):
+        cache = TokenCache(maxsize=2, ttl=60)
+        generation = cache.generation
+        cache.invalidate_user(self.user.pk)
+
+        cache.set(self.token.key, self.user, self.token, generation)
 
-# Create your tests here.
+        self.assertIsNone(cache.get(self.token.key))
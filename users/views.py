@@ -6,6 +6,7 @@ from rest_framework.decorators import permission_classes, api_view
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from users.authentication import token_cache
 from users.models import User
 from users.serializers import UserSerializer
 from utils.common import create_otp
@@ -14,7 +15,6 @@ from utils.common import create_otp
 @api_view(['GET'])
 @permission_classes((IsAuthenticated,))
 def me_view(request):
-    print('user: ', request.user)
     serializer = UserSerializer(request.user)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -41,7 +41,7 @@ def verify_user(request):
 
     if code == '111111':
         token, created = Token.objects.get_or_create(user=user)
-        print('token', token.key, 'created', created)
+        user.auth_token = token
         serializer = UserSerializer(user).data
 
         return Response(serializer, status=status.HTTP_200_OK)
@@ -85,4 +85,7 @@ def logout(request):
     device = FCMDevice.objects.filter(registration_id=device_id).first()
     if device:
         device.delete()
+    # The token is shared by the user's devices and stays valid, only its cache entry is dropped
+    if request.auth is not None:
+        token_cache.invalidate(request.auth.key)
     return Response({'message': 'User_logged out'}, status=status.HTTP_200_OK)
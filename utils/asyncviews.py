@@ -0,0 +1,86 @@
+"""
+Async versions of hot read views.
+
+Under daphne a sync view is run in a thread of the executor, one hop per request.
+An async view stays on the event loop: a token found in users.authentication's cache and
+cached responses cost no thread at all, and queries go through the async ORM.
+Anything the fast path doesn't handle (sessions, invalid tokens, other methods, forms,
+the browsable API) is passed to the sync view, so DRF still answers those with its own errors.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from users.authentication import CachedTokenAuthentication
+
+
+def accepts_json(request):
+    accept = request.headers.get('Accept', '*/*')
+    return 'json' in accept or '*/*' in accept
+
+
+def parse_json(request):
+    """Body of the request as a dict, ValueError if it isn't a JSON object"""
+    if request.method == 'GET' or not request.body:
+        return {}
+    if request.content_type != 'application/json':
+        raise ValueError('Not JSON')
+
+    data = json.loads(request.body)
+    if not isinstance(data, dict):
+        raise ValueError('Not a JSON object')
+    return data
+
+
+def render_json(response):
+    if isinstance(response, Response):
+        response.accepted_renderer = JSONRenderer()
+        response.accepted_media_type = 'application/json'
+        response.renderer_context = {}
+        response.render()
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def async_api_view(sync_view, methods):
+    """
+    Route to the decorated coroutine instead of sync_view, which serves what the coroutine can't.
+    Like in an @api_view, the coroutine reads request.data, request.query_params and request.user
+    and returns a Response. With ASYNC_VIEWS off sync_view is routed unchanged.
+    """
+    def decorator(handler):
+        if not settings.ASYNC_VIEWS:
+            return sync_view
+
+        fallback = sync_to_async(sync_view)
+        authentication = CachedTokenAuthentication()
+
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            credentials = None
+            if request.method in methods and accepts_json(request):
+                credentials = await authentication.aauthenticate(request)
+            if credentials is None:
+                return await fallback(request, *args, **kwargs)
+
+            try:
+                data = parse_json(request)
+            except ValueError:
+                return await fallback(request, *args, **kwargs)
+
+            request.user, request.auth = credentials
+            request.data = data
+            request.query_params = request.GET
+
+            return render_json(await handler(request, *args, **kwargs))
+
+        # Tokens aren't sent by browsers on their own, sessions go to sync_view which checks CSRF itself
+        view.csrf_exempt = True
+        return view
+
+    return decorator
@@ -1,7 +1,13 @@
+from django.db import router
 from django.db.models import Manager, Model, DateTimeField, BooleanField
 from django.http import Http404
 
 
+def write_db(manager):
+    """Database for raw SQL writes of the manager, self.db is the one for reads and may be a replica"""
+    return manager._db or router.db_for_write(manager.model, **manager._hints)
+
+
 class AppManager(Manager):
     def get_queryset(self):
         return super(AppManager, self).get_queryset().filter(is_deleted=False)
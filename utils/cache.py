@@ -0,0 +1,127 @@
+"""
+Response cache for rarely changing reference data.
+
+Every cached model has a version counter which is bumped by post_save/post_delete signals, and bumped
+again when the transaction commits: a body built meanwhile by another request from the committed rows
+would otherwise be kept under the new version.
+Rendered JSON bodies are kept in memory together with the versions they were built from,
+so a repeated request costs neither queries nor JSON encoding while the versions are current.
+Versions live in the memory of each process and are bumped only by writes of that process: cached models
+changed by `manage.py runjobs` or another command are served stale by daphne, with the same ETag, until
+daphne itself writes one of them or restarts.
+QuerySet.update() sends no signals, so it must not be used on cached models.
+Bodies are built from the primary, a replica behind the write that bumped the version would cache stale rows.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from utils.replicas import use_primary
+
+_lock = threading.Lock()
+_versions = {}
+_started_at = time.time()
+
+
+def table_version(model):
+    """Return (version, modified at) of the model's table"""
+    return _versions.get(model._meta.label, (0, _started_at))
+
+
+def bump_version(sender, using=None, **kwargs):
+    increment(sender)
+    transaction.on_commit(lambda: increment(sender), using=using)
+
+
+def increment(model):
+    with _lock:
+        version, _ = table_version(model)
+        _versions[model._meta.label] = (version + 1, time.time())
+
+
+def track_versions(*models):
+    for model in models:
+        uid = f'cache_version_{model._meta.label}'
+        post_save.connect(bump_version, sender=model, dispatch_uid=uid)
+        post_delete.connect(bump_version, sender=model, dispatch_uid=uid)
+
+
+def cached_json(*models):
+    """
+    Cache the JSON body of a GET view until one of the models changes.
+    Put it below @api_view and @permission_classes, so authentication still runs.
+    Works on async views too, a cached body is then served without leaving the event loop.
+    """
+    track_versions(*models)
+
+    def decorator(view):
+        entries = {}
+
+        def lookup(args, kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            versions = tuple(table_version(model) for model in models)
+            entry = entries.get(key)
+            if entry is not None and entry['versions'] == versions:
+                return key, versions, entry
+            return key, versions, None
+
+        def store(key, versions, response):
+            body = JSONRenderer().render(response.data)
+            entry = {
+                'versions': versions,
+                'body': body,
+                'etag': f'"{hashlib.md5(body).hexdigest()}"',
+                'last_modified': int(max(modified for _, modified in versions)),
+            }
+            entries[key] = entry
+            return entry
+
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                key, versions, entry = lookup(args, kwargs)
+                if entry is None:
+                    with use_primary():
+                        response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    entry = store(key, versions, response)
+
+                return respond(request, entry)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                key, versions, entry = lookup(args, kwargs)
+                if entry is None:
+                    with use_primary():
+                        response = view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    entry = store(key, versions, response)
+
+                return respond(request, entry)
+
+        return wrapper
+
+    return decorator
+
+
+def respond(request, entry):
+    response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry['body'], content_type='application/json')
+
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, no_cache=True)
+
+    return response
@@ -4,7 +4,8 @@ import string
 
 from channels.db import database_sync_to_async
 from fcm_django.models import FCMDevice
-import firebase_admin.messaging
+
+from utils.notifications import dispatcher
 
 
 # Create otp as a string
@@ -24,16 +25,12 @@ def duration_to_milliseconds(duration):
 
 
 def send_notification(title, body, members, image, chat_id, chat_type):
-    for member in members:
-        device = FCMDevice.objects.get(registration_id=member)
-        device.send_message(
-            firebase_admin.messaging.Message(
-                notification=firebase_admin.messaging.Notification(title=title, body=body, image=image),
-                data={
-                    'chat_id': f'{chat_id}',
-                    'chat_type': f'{chat_type}'
-                })
-        )
+    """Queue a notification to the devices with registration ids `members`"""
+    dispatcher.notify(
+        title, body, image,
+        data={'chat_id': chat_id, 'chat_type': chat_type},
+        tokens=members
+    )
     return "sent"
 
 
@@ -48,12 +45,7 @@ def get_fcm_device(registration_id):
 
 
 def send_any_notification(type, title, body, image, user_id, users_ids, data=None):
+    """Queue a notification to the devices of users_ids, except the ones of user_id"""
     data = data or {}
     data['type'] = f'{type}'
-    devices = FCMDevice.objects.filter(user_id__in=users_ids).exclude(user_id=user_id)
-    for device in devices:
-        device = FCMDevice.objects.get(registration_id=f'{device.registration_id}')
-        device.send_message(
-            firebase_admin.messaging.Message(
-                notification=firebase_admin.messaging.Notification(title=title, body=body, image=image), data=data)
-        )
+    dispatcher.notify(title, body, image, data=data, user_ids=users_ids, exclude_user_id=user_id)
@@ -0,0 +1,49 @@
+"""
+PostgreSQL backend whose connections come from utils.dbpool.pool.
+
+DATABASES entries using it take a POOL dict: SIZE, TIMEOUT (seconds a request waits for a
+connection) and MAX_LIFETIME (seconds after which a connection is closed instead of reused).
+CONN_MAX_AGE keeps its meaning: Django gives the connection back to the pool when it would
+have closed it.
+"""
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.base import IsolationLevel
+
+from utils.dbpool.pool import close_pools, get_pool
+
+DEFAULT_POOL = {'SIZE': 10, 'TIMEOUT': 10, 'MAX_LIFETIME': 3600}
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # Idle pooled connections would keep the test database in use, so it couldn't be dropped or copied
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools()
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        options = {**DEFAULT_POOL, **self.settings_dict.get('POOL', {})}
+        key = (self.alias, conn_params.get('dbname'), repr(sorted(conn_params.items())))
+        self.pool = get_pool(
+            key, options['SIZE'], options['TIMEOUT'], options['MAX_LIFETIME'],
+            self.settings_dict['CONN_HEALTH_CHECKS']
+        )
+        connection = self.pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Set by the parent only when it opens a connection
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
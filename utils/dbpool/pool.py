@@ -0,0 +1,187 @@
+"""
+Process-wide pool of PostgreSQL connections.
+
+Daphne runs the sync code of every request in a thread of its own, so Django's per-thread
+persistent connections (CONN_MAX_AGE) are never reused there and each request used to open
+a new connection. Connections are borrowed from this pool instead and given back when Django
+closes them at the end of the request. A request waits when all of them are busy; the waits
+are counted in stats().
+"""
+import logging
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+# A connection idle for longer is checked with SELECT 1 before it is handed out
+HEALTH_CHECK_IDLE = 5
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    return True
+
+
+def close_quietly(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, size, timeout, max_lifetime, health_checks):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self._idle = []  # (connection, created at, returned at), reused last in first out
+        self._in_use = {}  # id(connection) or id(reservation): (connection, created at, thread)
+        self._condition = threading.Condition()
+        self._stats = dict.fromkeys(
+            ('connects', 'checkouts', 'waits', 'wait_seconds', 'max_wait_seconds', 'timeouts', 'reclaimed'), 0
+        )
+
+    def getconn(self, connect):
+        """A connection from the pool, or a new one made by connect() while the pool isn't full"""
+        start = time.monotonic()
+        with self._condition:
+            while not self._idle and len(self._in_use) >= self.size and not self._reclaim():
+                remaining = start + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection was free for {self.timeout}s')
+                self._condition.wait(remaining)
+
+            self._record_wait(time.monotonic() - start)
+            connection, created_at, returned_at = self._idle.pop() if self._idle else (None, None, None)
+            # Holds the place in the pool while a connection is checked or opened
+            reservation = object()
+            self._in_use[id(reservation)] = (None, None, threading.current_thread())
+
+        try:
+            if connection is not None and not self._reusable(connection, returned_at):
+                close_quietly(connection)
+                connection = None
+            if connection is None:
+                connection = connect()
+                created_at = None
+        except BaseException:
+            with self._condition:
+                del self._in_use[id(reservation)]
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            if created_at is None:
+                created_at = time.monotonic()
+                self._stats['connects'] += 1
+            del self._in_use[id(reservation)]
+            self._in_use[id(connection)] = (connection, created_at, threading.current_thread())
+        return connection
+
+    def putconn(self, connection):
+        """Take the connection back, it is closed if it is broken, too old or not ours"""
+        with self._condition:
+            entry = self._in_use.get(id(connection))
+        if entry is None or entry[0] is not connection:
+            close_quietly(connection)
+            return
+
+        reusable = not connection.closed and time.monotonic() - entry[1] < self.max_lifetime
+        if reusable:
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                reusable = False
+            else:
+                try:
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        connection.rollback()
+                    # Handed out in autocommit like a new connection, the health check's SELECT 1
+                    # would otherwise open a transaction and Django couldn't switch autocommit on
+                    if not connection.autocommit:
+                        connection.autocommit = True
+                except psycopg2.Error:
+                    reusable = False
+        if not reusable:
+            close_quietly(connection)
+
+        with self._condition:
+            del self._in_use[id(connection)]
+            if reusable:
+                self._idle.append((connection, entry[1], time.monotonic()))
+            self._condition.notify()
+
+    def close_idle(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            close_quietly(connection)
+
+    def stats(self):
+        with self._condition:
+            return {**self._stats, 'size': self.size, 'in_use': len(self._in_use), 'idle': len(self._idle)}
+
+    def _reusable(self, connection, returned_at):
+        if connection.closed:
+            return False
+        if self.health_checks and time.monotonic() - returned_at > HEALTH_CHECK_IDLE:
+            return is_usable(connection)
+        return True
+
+    def _record_wait(self, waited):
+        self._stats['checkouts'] += 1
+        if waited > 0.001:
+            self._stats['waits'] += 1
+            self._stats['wait_seconds'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+
+    def _reclaim(self):
+        """
+        Free the places of connections whose thread has exited without closing them,
+        e.g. a thread that used the ORM outside of a request. Called under the lock.
+        """
+        abandoned = [key for key, (_, _, thread) in self._in_use.items() if not thread.is_alive()]
+        for key in abandoned:
+            connection, _, thread = self._in_use.pop(key)
+            logger.warning('Reclaimed a database connection abandoned by thread %s', thread.name)
+            if connection is not None:
+                close_quietly(connection)
+        self._stats['reclaimed'] += len(abandoned)
+        return bool(abandoned)
+
+
+def get_pool(key, size, timeout, max_lifetime, health_checks):
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(size, timeout, max_lifetime, health_checks)
+        return _pools[key]
+
+
+def close_pools():
+    """Close idle connections of every pool, e.g. before the database is dropped"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+def pool_stats():
+    """Stats of every pool of this process, with the alias and name of its database"""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return [{'alias': key[0], 'database': key[1], **pool.stats()} for key, pool in pools]
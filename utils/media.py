@@ -1,18 +1,98 @@
+"""
+Image and video processing.
+
+CPU-heavy work runs in one shared pool of MEDIA_WORKERS spawned processes. The workers live
+as long as the app, so OpenCV is loaded once per worker rather than once per file, and video
+metadata is read with OpenCV inside the worker instead of starting an ffprobe process per file.
+Functions submitted to the pool must not touch Django.
+"""
+import hashlib
 import json
+import logging
+import multiprocessing
 import os
 import subprocess
-import cv2 as cv
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.m4v', '.avi', '.mkv', '.webm', '.3gp'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """
+    Shared pool for CPU-heavy media work, sized by MEDIA_WORKERS.
+    Workers are spawned rather than forked, so they don't inherit database connections or threads.
+    """
+    global _pool
+    from django.conf import settings
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.MEDIA_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def file_digest(file):
+    """sha256 of a path or an open binary file, read in chunks so big videos aren't loaded into memory"""
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as opened:
+            return file_digest(opened)
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
 
-from PIL import Image
 
 def get_image_metadata(image_path):
-    image = Image.open(image_path)
-    width, height = image.size
+    with Image.open(image_path) as image:
+        width, height = image.size
     size = os.stat(image_path).st_size
 
     return width, height, size
 
 
+def render_image_variants(source_path, targets):
+    """
+    Write resized copies of the image, targets are [(path, width, format)] with format 'WEBP' or 'JPEG'.
+    Images are never upscaled. Returns (width, height, size) of every written file.
+    """
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    results = []
+    for path, width, image_format in targets:
+        resized = image
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        if image_format == 'JPEG' and resized.mode == 'RGBA':
+            # JPEG has no alpha, transparent parts become white
+            background = Image.new('RGB', resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.getchannel('A'))
+            resized = background
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        resized.save(path, image_format, quality=80, optimize=True)
+        results.append(get_image_metadata(path))
+
+    return results
+
+
 def get_video_metadata(video_path):
     command = [
         'ffprobe',
@@ -24,10 +104,11 @@ def get_video_metadata(video_path):
     ]
 
     result = subprocess.run(command, capture_output=True, text=True)
-    output = result.stdout
+    if result.returncode != 0:
+        raise ValueError(f'ffprobe failed for {video_path}: {result.stderr.strip()}')
 
-    metadata = json.loads(output)
-    stream_info = metadata.get('streams', [{}])[0]
+    metadata = json.loads(result.stdout)
+    stream_info = (metadata.get('streams') or [{}])[0]
 
     duration = float(stream_info.get('duration', 0))
     width = int(stream_info.get('width', 0))
@@ -37,24 +118,112 @@ def get_video_metadata(video_path):
     return duration, width, height, size
 
 
+def capture_video_metadata(video_path):
+    """Same as get_video_metadata but read by OpenCV in this process, None if it can't tell the duration"""
+    # OpenCV is heavy to import, it is loaded only in processes working on videos
+    import cv2 as cv
+
+    capture = cv.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            return None
+        fps = capture.get(cv.CAP_PROP_FPS)
+        frames = capture.get(cv.CAP_PROP_FRAME_COUNT)
+        width = int(capture.get(cv.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        capture.release()
+
+    if fps <= 0 or frames <= 0:
+        return None
+
+    return frames / fps, width, height, os.stat(video_path).st_size
+
+
+def extract_metadata(path):
+    """Metadata of an image or a video as a dict"""
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        # ffprobe only for containers OpenCV can't read the duration of
+        duration, width, height, size = capture_video_metadata(path) or get_video_metadata(path)
+        return {'type': 'video', 'width': width, 'height': height, 'duration': duration, 'size': size}
+
+    width, height, size = get_image_metadata(path)
+    return {'type': 'image', 'width': width, 'height': height, 'size': size}
+
+
+def extract_metadata_many(paths, max_pending=None):
+    """
+    Yield (path, metadata) for every path as soon as it is ready, so results stream in completion order.
+    metadata is the exception if the file couldn't be read.
+    Files are hashed here first: copies of one file in the batch are extracted once, and the metadata
+    is saved on the Blob of the same content, so a blob is never extracted again, not even after a restart
+    or by another process. Files which aren't stored as blobs are extracted every time.
+    """
+    from django.conf import settings
+
+    from blobs.models import Blob
+
+    pool = get_process_pool()
+    max_pending = max_pending or settings.MEDIA_WORKERS * 2
+    pending = {}  # future: digest
+    waiting = {}  # digest: paths
+
+    def finish(done):
+        for future in done:
+            digest = pending.pop(future)
+            try:
+                metadata = future.result()
+            except Exception as e:
+                logger.warning('Could not extract metadata of %s: %s', waiting[digest][0], e)
+                metadata = e
+            else:
+                Blob.objects.filter(digest=digest).update(metadata=metadata)
+            for waiting_path in waiting.pop(digest):
+                yield waiting_path, metadata
+
+    for path in paths:
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            yield path, e
+            continue
+
+        if digest in waiting:
+            waiting[digest].append(path)
+            continue
+
+        metadata = Blob.objects.filter(digest=digest).values_list('metadata', flat=True).first()
+        if metadata is not None:
+            yield path, metadata
+            continue
+
+        # Bounded, so a bulk import doesn't queue every file in memory at once
+        while len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from finish(done)
+
+        waiting[digest] = [path]
+        pending[pool.submit(extract_metadata, path)] = digest
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        yield from finish(done)
+
+
 def generate_video_thumbnail(video_path, thumbnail_path):
-    # Open the video file
-    print('video_path: ', video_path)
-    print('thumbnail_path: ', thumbnail_path)
-    vidcap = cv.VideoCapture(video_path)
-
-    # Set the video capture position to 1 second (1000 milliseconds)
-    vidcap.set(cv.CAP_PROP_POS_MSEC, 1000)
-
-    # Read a frame from the video
-    success, image = vidcap.read()
-
-    # Check if the frame was read successfully
-    if success:
-        # Save the frame as a thumbnail image file
-        cv.imwrite(thumbnail_path, image)
-    else:
-        print("Failed to read frame from video.")
-
-    # Release the video capture object
-    vidcap.release()
+    """Save the frame at 1 second as the thumbnail, returns whether it was written"""
+    import cv2 as cv
+
+    capture = cv.VideoCapture(video_path)
+    try:
+        capture.set(cv.CAP_PROP_POS_MSEC, 1000)
+        success, image = capture.read()
+    finally:
+        capture.release()
+
+    if not success:
+        logger.warning('Failed to read a frame of %s', video_path)
+        return False
+
+    cv.imwrite(thumbnail_path, image)
+    return True
@@ -0,0 +1,60 @@
+"""
+Django middlewares that don't leave the event loop.
+
+Under ASGI Django's MiddlewareMixin runs process_request and process_response of every
+middleware in a thread, so the stock stack costs over a dozen thread hops per request,
+far more than the view itself. The methods of these middlewares only look at headers and
+lazy objects, so they run inline. The session is saved in a thread as before.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.middleware import clickjacking, common, security
+
+
+class InlineMiddlewareMixin:
+    def inline_response(self, request):
+        """Whether process_response can run on the event loop for this request"""
+        return True
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            if self.inline_response(request):
+                response = self.process_response(request, response)
+            else:
+                response = await sync_to_async(self.process_response, thread_sensitive=True)(request, response)
+        return response
+
+
+class SecurityMiddleware(InlineMiddlewareMixin, security.SecurityMiddleware):
+    pass
+
+
+class SessionMiddleware(InlineMiddlewareMixin, sessions.SessionMiddleware):
+    def inline_response(self, request):
+        # An untouched session is neither loaded nor saved
+        return not request.session.accessed
+
+
+class CommonMiddleware(InlineMiddlewareMixin, common.CommonMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(InlineMiddlewareMixin, auth.AuthenticationMiddleware):
+    pass
+
+
+class MessageMiddleware(InlineMiddlewareMixin, messages.MessageMiddleware):
+    def inline_response(self, request):
+        # Used messages are stored in the session, which may have to be loaded
+        storage = getattr(request, '_messages', None)
+        return storage is None or not (storage.used or storage.added_new)
+
+
+class XFrameOptionsMiddleware(InlineMiddlewareMixin, clickjacking.XFrameOptionsMiddleware):
+    pass
@@ -0,0 +1,121 @@
+"""
+Push notifications through FCM.
+
+notify() only queues a job: after the surrounding transaction commits, a job worker
+loads the tokens with one query and sends them in multicast batches of up to 500 tokens.
+Tokens failing with a temporary error are retried with backoff, dead tokens are deactivated.
+"""
+import logging
+import time
+
+from fcm_django.models import FCMDevice
+from fcm_django.settings import FCM_DJANGO_SETTINGS
+from firebase_admin import exceptions, messaging
+
+from jobs.queue import job
+
+logger = logging.getLogger(__name__)
+
+FCM_BATCH_SIZE = 500
+RETRIES = 3
+RETRY_DELAY = 0.5  # seconds, doubled after every retry
+
+# Same errors fcm_django deactivates devices for
+DEAD_TOKEN_ERRORS = (messaging.UnregisteredError, messaging.SenderIdMismatchError, exceptions.InvalidArgumentError)
+RETRYABLE_ERRORS = (exceptions.UnavailableError, exceptions.InternalError, messaging.QuotaExceededError)
+
+
+class FCMTransport:
+    def send(self, tokens, notification, data):
+        """Send one multicast, returns the error of every token, None if it was delivered"""
+        message = messaging.MulticastMessage(tokens=tokens, notification=notification, data=data)
+        try:
+            response = messaging.send_each_for_multicast(message)
+        except RETRYABLE_ERRORS as e:
+            return [e] * len(tokens)
+
+        return [result.exception for result in response.responses]
+
+
+class Dispatcher:
+    def __init__(self, transport):
+        self.transport = transport
+
+    def notify(self, title, body, image=None, data=None, user_ids=None, tokens=None, exclude_user_id=None):
+        """
+        Queue sending to the active devices of user_ids and/or the given registration tokens.
+        It is sent once the current transaction commits.
+        """
+        send_push.enqueue(
+            title=title, body=body, image=image, data=data,
+            user_ids=None if user_ids is None else list(user_ids),
+            tokens=None if tokens is None else list(tokens),
+            exclude_user_id=exclude_user_id
+        )
+
+    def send(self, title, body, image=None, data=None, user_ids=None, tokens=None, exclude_user_id=None):
+        """Send in the calling thread, returns (number of delivered tokens, deactivated tokens)"""
+        devices = FCMDevice.objects.filter(active=True)
+        if user_ids is not None:
+            devices = devices.filter(user_id__in=user_ids)
+        if tokens is not None:
+            devices = devices.filter(registration_id__in=tokens)
+        if exclude_user_id is not None:
+            devices = devices.exclude(user_id=exclude_user_id)
+        tokens = list(devices.values_list('registration_id', flat=True).distinct())
+
+        notification = messaging.Notification(title=title, body=body, image=image)
+        # FCM only accepts string values in data
+        data = {key: str(value) for key, value in (data or {}).items()}
+
+        delivered = 0
+        dead = []
+        for i in range(0, len(tokens), FCM_BATCH_SIZE):
+            batch_delivered, batch_dead = self._send_batch(tokens[i:i + FCM_BATCH_SIZE], notification, data)
+            delivered += batch_delivered
+            dead += batch_dead
+
+        if dead:
+            self.prune(dead)
+
+        return delivered, dead
+
+    def _send_batch(self, tokens, notification, data):
+        delivered = 0
+        dead = []
+        for attempt in range(RETRIES + 1):
+            retry = []
+            for token, error in zip(tokens, self.transport.send(tokens, notification, data)):
+                if error is None:
+                    delivered += 1
+                elif isinstance(error, DEAD_TOKEN_ERRORS):
+                    dead.append(token)
+                elif isinstance(error, RETRYABLE_ERRORS):
+                    retry.append(token)
+                else:
+                    logger.warning('Notification to a device failed: %s', error)
+
+            if not retry:
+                break
+            if attempt == RETRIES:
+                logger.warning('Notification to %d devices failed after %d retries', len(retry), RETRIES)
+                break
+
+            time.sleep(RETRY_DELAY * 2 ** attempt)
+            tokens = retry
+
+        return delivered, dead
+
+    def prune(self, tokens):
+        if FCM_DJANGO_SETTINGS['DELETE_INACTIVE_DEVICES']:
+            FCMDevice.objects.filter(registration_id__in=tokens).delete()
+        else:
+            FCMDevice.objects.filter(registration_id__in=tokens).update(active=False)
+
+
+dispatcher = Dispatcher(FCMTransport())
+
+
+@job(max_attempts=3)
+def send_push(**kwargs):
+    dispatcher.send(**kwargs)
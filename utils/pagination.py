@@ -0,0 +1,109 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder cuts microseconds, a cursor has to keep them to stay exact
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    data = json.dumps(values, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (AttributeError, TypeError, binascii.Error, UnicodeError, ValueError):
+        # AttributeError and TypeError come from a cursor which isn't a string in the JSON body
+        raise ValueError('Invalid cursor')
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+
+    return values
+
+
+def get_page_size(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid limit')
+
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _row_value(row, field):
+    if isinstance(row, dict):
+        return row[field]
+    return getattr(row, field)
+
+
+def _after(ordering, values):
+    """
+    Build the "comes after (values)" condition for the ordering.
+    The last field of the ordering must be unique, e.g. id.
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+
+    condition = Q()
+    for i in range(len(fields)):
+        equal = {fields[j]: values[j] for j in range(i)}
+        condition |= Q(**equal, **{f'{fields[i]}__{lookups[i]}': values[i]})
+
+    # Duplicated bound on the leading field lets the planner use a range scan on its index
+    return Q(**{f'{fields[0]}__{lookups[0]}e': values[0]}) & condition
+
+
+def _page_queryset(queryset, ordering, cursor, limit):
+    """The page of queryset with one more row, which tells whether there is a next page"""
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, len(ordering))))
+
+    return queryset[:limit + 1]
+
+
+def _split_page(rows, ordering, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_row_value(rows[-1], field.lstrip('-')) for field in ordering])
+
+    return rows, next_cursor
+
+
+def paginate_keyset(queryset, ordering, cursor=None, limit=None):
+    """
+    Return one page of queryset sorted by ordering and the cursor of the next page.
+    Unlike OFFSET, the cost of a page does not grow with its depth.
+    """
+    limit = get_page_size(limit)
+    rows = list(_page_queryset(queryset, ordering, cursor, limit))
+
+    return _split_page(rows, ordering, limit)
+
+
+async def apaginate_keyset(queryset, ordering, cursor=None, limit=None):
+    """paginate_keyset() with the async ORM"""
+    limit = get_page_size(limit)
+    rows = [row async for row in _page_queryset(queryset, ordering, cursor, limit)]
+
+    return _split_page(rows, ordering, limit)
@@ -0,0 +1,143 @@
+"""
+Read replicas for catalog reads.
+
+During a request, reads of REPLICA_APPS models go to a random REPLICA_DATABASES replica and
+everything else goes to the primary. Reads stay on the primary:
+- outside of requests (jobs, commands), which often read what they have just committed
+- inside transactions
+- within use_primary()
+- in requests with unsafe methods, which read what they are about to update, unless the view is
+  decorated with replica_reads
+- after a write of the request
+- for REPLICA_STICKY_SECONDS after a client's own write, so a client reads its writes
+  despite the replication lag
+Clients are told apart by their Authorization header or session cookie. The recent writers are
+kept in the memory of each process, so with several web processes a client's next request may
+reach one which doesn't know about its write and read from a replica behind it.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+from utils.middleware import InlineMiddlewareMixin
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Expired writers are dropped once there are more than this many
+MAX_WRITERS = 10000
+
+_state = ContextVar('replica_state', default=None)
+_writers = {}  # client key: primary is used until
+_writers_lock = threading.Lock()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state['primary'] or state['unsafe'] or state['wrote'] or not settings.REPLICA_DATABASES:
+            return None
+        if model._meta.app_label not in settings.REPLICA_APPS or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.REPLICA_DATABASES
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary within the block, e.g. to fill a cache that must not get stale rows"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+
+    previous = state['primary']
+    state['primary'] = True
+    try:
+        yield
+    finally:
+        state['primary'] = previous
+
+
+def replica_reads(view):
+    """Let a view of unsafe methods that only reads, e.g. a search taking its filters in a POST body, use replicas"""
+    def allow():
+        state = _state.get()
+        if state is not None:
+            state['unsafe'] = False
+
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            allow()
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            allow()
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def client_key(request):
+    authorization = request.headers.get('Authorization')
+    if authorization:
+        return authorization
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    return f'session:{session}' if session else None
+
+
+def wrote_recently(key):
+    until = _writers.get(key)
+    return until is not None and until > time.monotonic()
+
+
+def remember_writer(key):
+    now = time.monotonic()
+    with _writers_lock:
+        if len(_writers) >= MAX_WRITERS:
+            for expired in [writer for writer, until in _writers.items() if until <= now]:
+                del _writers[expired]
+        _writers[key] = now + settings.REPLICA_STICKY_SECONDS
+
+
+class ReplicaMiddleware(InlineMiddlewareMixin, MiddlewareMixin):
+    """Sets up routing of the request, put it before the middlewares that query the database"""
+
+    def process_request(self, request):
+        key = client_key(request)
+        request.replica_state = {
+            'key': key,
+            'primary': key is not None and wrote_recently(key),
+            'unsafe': request.method not in SAFE_METHODS,
+            'wrote': False,
+        }
+        request.replica_token = _state.set(request.replica_state)
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'replica_token'):
+            return response
+
+        _state.reset(request.replica_token)
+        state = request.replica_state
+        if state['wrote'] and state['key'] is not None:
+            remember_writer(state['key'])
+        return response
@@ -0,0 +1,111 @@
+"""
+Content-addressed media storage.
+
+Uploads are hashed while they are streamed to disk and stored once under their sha256,
+so the same photo uploaded for many medicines takes the space of one file.
+Blob rows count the model fields referencing each file, files nobody references
+are removed by `manage.py prune_blobs`. A blob never changes, so its URL can be cached forever.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIRECTORY = 'media/blobs'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The name is replaced by the digest in _save, equal names are the same content
+        return name
+
+    def _save(self, name, content):
+        from blobs.models import Blob
+
+        extension = os.path.splitext(name)[1].lower()
+        directory = self.path(BLOB_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        # Same filesystem as the blob, so the rename below is atomic
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temporary:
+            try:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary.write(chunk)
+                    size += len(chunk)
+            except BaseException:
+                os.unlink(temporary.name)
+                raise
+
+        digest = digest.hexdigest()
+        name = f'{BLOB_DIRECTORY}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+        path = self.path(name)
+        if os.path.exists(path):
+            os.unlink(temporary.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+            os.replace(temporary.name, path)
+
+        _, created = Blob.objects.get_or_create(digest=digest, defaults={'name': name, 'size': size})
+        if not created:
+            # Restarts the grace period, so prune_blobs doesn't take a blob that is about to be referenced
+            Blob.objects.filter(digest=digest).update(updated_at=timezone.now())
+
+        return name
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    return blob_storage
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIRECTORY}/')
+
+
+def track_blob_references(model, field_name):
+    """Keep refcounts of the blobs referenced by model.field_name in the transaction that changes the rows"""
+    from blobs.models import Blob
+
+    original = f'_original_{field_name}'
+
+    def remember(instance, **kwargs):
+        if field_name in instance.__dict__:
+            value = instance.__dict__[field_name]
+            # Only the name, a FieldFile is renamed in place by FieldFile.save()
+            instance.__dict__[original] = value if isinstance(value, str) else getattr(value, 'name', None)
+
+    def saved(instance, raw=False, **kwargs):
+        if original not in instance.__dict__ and field_name not in instance.__dict__:
+            return  # deferred and never set, so unchanged
+        old = instance.__dict__.get(original) or ''
+        new = getattr(instance, field_name).name or ''
+        instance.__dict__[original] = new
+        if old == new:
+            return
+        if is_blob(new):
+            Blob.objects.acquire([new])
+        if is_blob(old):
+            Blob.objects.release([old])
+
+    def deleted(instance, **kwargs):
+        name = getattr(instance, field_name).name
+        if is_blob(name):
+            Blob.objects.release([name])
+
+    uid = f'blob_references_{model._meta.label}_{field_name}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
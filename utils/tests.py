@@ -0,0 +1,294 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import psycopg2
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from fcm_django.models import FCMDevice
+from firebase_admin import exceptions, messaging
+from PIL import Image
+
+from blobs.models import Blob
+from cart.models import Cart
+from jobs.models import Job
+from medicines.models import Medicine
+from users.models import User
+from utils import notifications
+from utils.dbpool.pool import ConnectionPool, PoolTimeout
+from utils.media import extract_metadata_many, file_digest
+from utils.notifications import Dispatcher
+from utils.replicas import ReplicaMiddleware, replica_reads, use_primary
+
+
+class FakeTransport:
+    """Records multicasts and answers with the errors scripted per token"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.calls = []
+
+    def send(self, tokens, notification, data):
+        self.calls.append((list(tokens), notification, data))
+        results = []
+        for token in tokens:
+            scripted = self.errors.get(token, [])
+            results.append(scripted.pop(0) if scripted else None)
+        return results
+
+
+class DispatcherTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', phone='+77000000000')
+        self.other = User.objects.create_user(username='other', phone='+77000000001')
+
+    def add_devices(self, user, count, prefix):
+        FCMDevice.objects.bulk_create([
+            FCMDevice(user=user, registration_id=f'{prefix}-{i}', type='android')
+            for i in range(count)
+        ])
+
+    def test_tokens_are_loaded_once_and_sent_in_batches(self):
+        self.add_devices(self.user, 1200, 'user')
+        self.add_devices(self.other, 3, 'other')
+        transport = FakeTransport()
+
+        with self.assertNumQueries(1):
+            delivered, dead = Dispatcher(transport).send(
+                'Title', 'Body', data={'order_id': 1}, user_ids=[self.user.id, self.other.id],
+                exclude_user_id=self.other.id
+            )
+
+        self.assertEqual(delivered, 1200)
+        self.assertEqual(dead, [])
+        self.assertEqual([len(tokens) for tokens, _, _ in transport.calls], [500, 500, 200])
+        self.assertEqual(transport.calls[0][2], {'order_id': '1'})
+
+    @mock.patch.object(notifications, 'RETRY_DELAY', 0)
+    def test_retries_and_prunes_dead_tokens(self):
+        self.add_devices(self.user, 3, 'user')
+        unavailable = exceptions.UnavailableError('Unavailable')
+        transport = FakeTransport({
+            'user-0': [messaging.UnregisteredError('Unregistered')],
+            'user-1': [unavailable, unavailable],
+        })
+
+        delivered, dead = Dispatcher(transport).send('Title', 'Body', user_ids=[self.user.id])
+
+        self.assertEqual(delivered, 2)
+        self.assertEqual(dead, ['user-0'])
+        self.assertEqual(
+            [sorted(tokens) for tokens, _, _ in transport.calls],
+            [['user-0', 'user-1', 'user-2'], ['user-1'], ['user-1']]
+        )
+        self.assertEqual(
+            list(FCMDevice.objects.filter(active=False).values_list('registration_id', flat=True)),
+            ['user-0']
+        )
+
+    def test_notify_queues_a_job(self):
+        Dispatcher(FakeTransport()).notify('Title', 'Body', user_ids=User.objects.values_list('id', flat=True))
+
+        queued = Job.objects.get()
+        self.assertEqual(queued.name, 'utils.notifications.send_push')
+        self.assertEqual(sorted(queued.payload['user_ids']), [self.user.id, self.other.id])
+
+class ConnectionPoolTest(SimpleTestCase):
+    def connect(self):
+        return mock.Mock(closed=0, info=mock.Mock(transaction_status=0))
+
+    def connect_postgres(self):
+        return psycopg2.connect(**connection.get_connection_params())
+
+    def test_waits_for_a_free_connection(self):
+        pool = ConnectionPool(size=1, timeout=0.05, max_lifetime=60, health_checks=False)
+        connection = pool.getconn(self.connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(self.connect)
+
+        threading.Timer(0.01, pool.putconn, [connection]).start()
+        pool.timeout = 5
+        self.assertIs(pool.getconn(self.connect), connection)
+
+        stats = pool.stats()
+        self.assertEqual((stats['connects'], stats['timeouts'], stats['waits'], stats['in_use']), (1, 1, 1, 1))
+        self.assertGreater(stats['max_wait_seconds'], 0)
+
+    def test_connections_of_exited_threads_are_reclaimed(self):
+        pool = ConnectionPool(size=1, timeout=5, max_lifetime=60, health_checks=False)
+        taken = []
+        thread = threading.Thread(target=lambda: taken.append(pool.getconn(self.connect)))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(pool.getconn(self.connect), taken[0])
+        taken[0].close.assert_called_once()
+        self.assertEqual(pool.stats()['reclaimed'], 1)
+
+    def test_broken_and_old_connections_are_not_reused(self):
+        pool = ConnectionPool(size=2, timeout=5, max_lifetime=60, health_checks=False)
+        broken = pool.getconn(self.connect)
+        broken.closed = 2
+        pool.putconn(broken)
+
+        old = pool.getconn(self.connect)
+        pool.max_lifetime = 0
+        pool.putconn(old)
+
+        self.assertEqual(pool.stats()['idle'], 0)
+        self.assertEqual(pool.stats()['connects'], 2)
+
+    def test_connection_returned_in_a_transaction_is_handed_out_in_autocommit(self):
+        pool = ConnectionPool(size=1, timeout=5, max_lifetime=60, health_checks=True)
+        raw = pool.getconn(self.connect_postgres)
+        self.addCleanup(raw.close)
+        raw.autocommit = False
+        with raw.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        pool.putconn(raw)
+
+        # Health checked like a connection idle for long
+        with mock.patch('utils.dbpool.pool.HEALTH_CHECK_IDLE', -1):
+            self.assertIs(pool.getconn(self.connect_postgres), raw)
+        # What Django does with a new connection
+        raw.autocommit = True
+        self.assertEqual(raw.info.transaction_status, psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+
+class InlineMiddlewareTest(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'secret', phone='+77000000000')
+        self.medicine = Medicine.objects.create(name='Aspirin', description='', price=100)
+
+    async def test_session_and_messages_are_saved_under_asgi(self):
+        response = await self.async_client.post(
+            reverse('admin:login'), {'username': '+77000000000', 'password': 'secret', 'next': reverse('admin:index')}
+        )
+        self.assertEqual(response.status_code, 302)
+        # Logged in by the session saved on the way out
+        self.assertEqual((await self.async_client.get(reverse('admin:index'))).status_code, 200)
+
+        response = await self.async_client.post(
+            reverse('admin:inventory_stock_add'), {'medicine': self.medicine.id, 'available': 5}
+        )
+        self.assertEqual(response.status_code, 302)
+        response = await self.async_client.get(response['Location'])
+        self.assertContains(response, 'class="messagelist"')
+        # Shown once
+        response = await self.async_client.get(reverse('admin:inventory_stock_changelist'))
+        self.assertNotContains(response, 'class="messagelist"')
+
+
+class MediaMetadataTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_image(self, name, size):
+        path = os.path.join(self.directory, name)
+        Image.new('RGB', size, 'red').save(path, 'PNG')
+        return path
+
+    def write_video(self, name, size, frames, fps):
+        import cv2 as cv
+        import numpy
+
+        path = os.path.join(self.directory, name)
+        writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*'MJPG'), fps, size)
+        for _ in range(frames):
+            writer.write(numpy.zeros((size[1], size[0], 3), dtype=numpy.uint8))
+        writer.release()
+        return path
+
+    def store_as_blob(self, path):
+        Blob.objects.create(digest=file_digest(path), name=os.path.basename(path), size=os.path.getsize(path))
+
+    def extract(self, paths):
+        pool = mock.MagicMock(wraps=ThreadPoolExecutor(2))
+        with mock.patch('utils.media.get_process_pool', return_value=pool):
+            results = dict(extract_metadata_many(paths, max_pending=1))
+        return results, pool.submit.call_count
+
+    def test_same_content_is_extracted_once(self):
+        first = self.write_image('first.png', (30, 20))
+        copy = os.path.join(self.directory, 'copy.png')
+        shutil.copy(first, copy)
+        other = self.write_image('other.png', (10, 10))
+        not_blob = self.write_image('not_blob.png', (5, 5))
+        broken = os.path.join(self.directory, 'broken.png')
+        with open(broken, 'wb') as f:
+            f.write(b'not an image')
+        for path in (first, other, broken):
+            self.store_as_blob(path)
+
+        results, submitted = self.extract([first, copy, other, not_blob, broken])
+
+        self.assertEqual(submitted, 4)
+        self.assertEqual((results[copy]['width'], results[copy]['height']), (30, 20))
+        self.assertEqual(results[other]['type'], 'image')
+        self.assertIsInstance(results[broken], Exception)
+        self.assertEqual(Blob.objects.get(digest=file_digest(other)).metadata, results[other])
+
+        results, submitted = self.extract([copy, other, not_blob])
+
+        self.assertEqual(submitted, 1)
+        self.assertEqual(results[other]['width'], 10)
+
+    def test_video_metadata_is_read_by_opencv(self):
+        video = self.write_video('clip.avi', (32, 24), frames=10, fps=5)
+
+        with mock.patch('utils.media.get_video_metadata', side_effect=AssertionError('ffprobe called')):
+            results, _ = self.extract([video])
+
+        metadata = results[video]
+        self.assertEqual((metadata['type'], metadata['width'], metadata['height']), ('video', 32, 24))
+        self.assertAlmostEqual(metadata['duration'], 2)
+        self.assertEqual(metadata['size'], os.path.getsize(video))
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'], REPLICA_STICKY_SECONDS=60)
+class ReplicaRouterTest(SimpleTestCase):
+    def request(self, authorization='Token first', write=False, primary=False, method='get', decorate=None):
+        """Route reads of a medicine and a cart in a request, and a medicine after the writes, returns their databases"""
+        routed = {}
+
+        def view(request):
+            if primary:
+                with use_primary():
+                    routed['medicine'] = router.db_for_read(Medicine)
+            else:
+                routed['medicine'] = router.db_for_read(Medicine)
+            routed['cart'] = router.db_for_read(Cart)
+            if write:
+                router.db_for_write(Cart)
+            routed['medicine_after'] = router.db_for_read(Medicine)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION=authorization)
+        ReplicaMiddleware(decorate(view) if decorate else view)(request)
+        return routed
+
+    def test_catalog_reads_of_requests_go_to_replicas(self):
+        self.assertEqual(self.request(), {'medicine': 'replica_1', 'cart': 'default', 'medicine_after': 'replica_1'})
+        self.assertEqual(self.request(primary=True)['medicine'], 'default')
+        self.assertEqual(router.db_for_read(Medicine), 'default')
+
+    def test_unsafe_requests_read_from_the_primary(self):
+        self.assertEqual(self.request(method='put', authorization='Token editor')['medicine'], 'default')
+        self.assertEqual(self.request(method='post', decorate=replica_reads)['medicine'], 'replica_1')
+
+    def test_client_reads_its_writes_from_the_primary(self):
+        self.assertEqual(self.request(authorization='Token writer', write=True)['medicine_after'], 'default')
+
+        self.assertEqual(self.request(authorization='Token writer')['medicine'], 'default')
+        self.assertEqual(self.request(authorization='Token other')['medicine'], 'replica_1')
+
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.request(authorization='Token brief', write=True)
+        self.assertEqual(self.request(authorization='Token brief')['medicine'], 'replica_1')